@@ -1,14 +1,46 @@
+import importlib
+import importlib.abc
+import importlib.util
+import os
 import sys
+from collections.abc import Sequence
+from importlib.machinery import ModuleSpec
+from types import ModuleType
 
 import typer
 
-from . import vasp
+from .utils.cli_utils import should_define
 
-from .subfig import subfig
-from .vasp.cli import app as vasp_app
-from .input.cli import app as input_app
-from .calc.cli import app as calc_app
-sys.modules["hbtools.plot"] = vasp
+
+class _PlotAlias(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """``hbtools.plot`` is the old name of ``hbtools.vasp``, imported on first use."""
+
+    def find_spec(
+        self,
+        fullname: str,
+        path: Sequence[str] | None,
+        target: ModuleType | None = None,
+    ) -> ModuleSpec | None:
+        if fullname != "hbtools.plot" and not fullname.startswith("hbtools.plot."):
+            return None
+        return importlib.util.spec_from_loader(fullname, self)
+
+    def __init__(self):
+        self._specs: dict[str, ModuleSpec | None] = {}
+
+    def create_module(self, spec: ModuleSpec) -> ModuleType:
+        module = importlib.import_module(spec.name.replace("plot", "vasp", 1))
+        self._specs[spec.name] = module.__spec__
+        return module
+
+    def exec_module(self, module: ModuleType):
+        # the import system gave the shared module the alias spec, restore it
+        assert module.__spec__ is not None
+        module.__spec__ = self._specs.pop(module.__spec__.name)
+
+
+# ahead of the path finder, so submodules are not imported a second time
+sys.meta_path.insert(0, _PlotAlias())
 
 app = typer.Typer(
     no_args_is_help=True,
@@ -17,8 +49,62 @@ app = typer.Typer(
 )
 
 
-app.add_typer(vasp_app, name="vasp")
-app.add_typer(input_app, name="input")
-app.add_typer(calc_app, name="calc")
+# keeps hb a group when only the invoked subcommand is registered
+@app.callback()
+def _main():
+    pass
+
+
+# subcommand name -> module, imported only when the subcommand is invoked
+_SUBAPPS = {"vasp": ".vasp.cli", "input": ".input.cli", "calc": ".calc.cli"}
+_COMMANDS = {"subfig": ".subfig", "serve": ".serve"}
+_registered: set[str] = set()
+
+
+def _register(name: str):
+    if name in _registered:
+        return
+    _registered.add(name)
+    # drop the placeholder that only listed the name in the help
+    app.registered_groups = [i for i in app.registered_groups if i.name != name]
+    app.registered_commands = [i for i in app.registered_commands if i.name != name]
+    if name in _SUBAPPS:
+        module = importlib.import_module(_SUBAPPS[name], __name__)
+        app.add_typer(module.app, name=name)
+    else:
+        module = importlib.import_module(_COMMANDS[name], __name__)
+        app.command()(getattr(module, name))
+
+
+def _placeholder():
+    pass
+
+
+_invoked = [name for name in (*_SUBAPPS, *_COMMANDS) if should_define(name)]
+for _name in _invoked:
+    _register(_name)
+if not _invoked:
+    # the top level help only needs the names, nothing is imported for it
+    for _name in _SUBAPPS:
+        app.add_typer(typer.Typer(), name=_name)
+    for _name in _COMMANDS:
+        app.command(_name)(_placeholder)
+
+
+def register_all() -> typer.Typer:
+    """The app with every subcommand, for the daemon that runs any of them."""
+    for name in (*_SUBAPPS, *_COMMANDS):
+        _register(name)
+    return app
+
+
+def main():
+    """Entry point of hb, hands the command to a running ``hb serve`` if any."""
+    if os.environ.get("HB_NO_DAEMON"):
+        return app()
+    from .serve import forward
 
-app.command()(subfig)
+    code = forward(sys.argv[1:])
+    if code is None:
+        return app()
+    sys.exit(code)
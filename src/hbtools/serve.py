@@ -0,0 +1,212 @@
+"""Optional hb daemon.
+
+``hb serve`` keeps numpy, h5py, lxml, matplotlib and recently read vasp files
+loaded and listens on a Unix socket. The ``hb`` entry point sends its argv,
+working directory, environment and standard streams there and only runs the
+command itself when no daemon answers. Commands that show a figure always
+run locally.
+
+The socket lives in ``$XDG_RUNTIME_DIR`` or in a private ``hbtools-<uid>``
+directory under the temporary directory. The client only talks to a socket
+owned by the same user and closed to everyone else, since it hands over its
+environment and streams.
+
+Requests run one after another in the daemon process, a second ``hb`` waits
+until the running command is done.
+"""
+
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+import tempfile
+from pathlib import Path
+from typing import Annotated, Any
+
+import typer
+
+# commands that open a window unless --dontshow is given
+_FIGURE_COMMANDS = {("vasp", "band"), ("vasp", "dos")}
+
+
+def socket_path() -> Path:
+    if "HB_SOCKET" in os.environ:
+        return Path(os.environ["HB_SOCKET"])
+    if runtime := os.environ.get("XDG_RUNTIME_DIR"):
+        return Path(runtime) / f"hbtools-{os.getuid()}.sock"
+    return Path(tempfile.gettempdir()) / f"hbtools-{os.getuid()}" / "hb.sock"
+
+
+def _private(path: Path) -> bool:
+    """Whether ``path`` belongs to this user and nobody else can use it."""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return info.st_uid == os.getuid() and not info.st_mode & 0o077
+
+
+def _peer_uid(client: socket.socket) -> int | None:
+    """User of the process listening on a connected socket, if the OS says."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    creds = client.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    return struct.unpack("3i", creds)[1]
+
+
+def _shows_figure(argv: list[str]) -> bool:
+    return tuple(argv[:2]) in _FIGURE_COMMANDS and "--dontshow" not in argv
+
+
+def forward(argv: list[str]) -> int | None:
+    """Run ``argv`` in the daemon, ``None`` if it has to run in this process."""
+    if (
+        os.environ.get("HB_NO_DAEMON")
+        or not hasattr(socket, "AF_UNIX")
+        or argv[:1] == ["serve"]
+        or _shows_figure(argv)
+    ):
+        return None
+    path = socket_path()
+    if not path.exists():
+        return None
+    if not _private(path) or not stat.S_ISSOCK(os.lstat(path).st_mode):
+        print(f"hb: ignoring {path}, it is not a private socket", file=sys.stderr)
+        return None
+
+    request = {"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(str(path))
+        except OSError:
+            return None
+        if _peer_uid(client) not in (None, os.getuid()):
+            return None
+        sys.stdout.flush()
+        sys.stderr.flush()
+        socket.send_fds(client, [json.dumps(request).encode()], [0, 1, 2])
+        client.shutdown(socket.SHUT_WR)
+        reply = b"".join(iter(lambda: client.recv(4096), b""))
+    if not reply:
+        # the daemon died while running the command
+        return None
+    return int(json.loads(reply)["code"])
+
+
+def _warm_up():
+    """Import what the commands need, so requests don't pay for it."""
+    import importlib
+
+    import matplotlib
+
+    matplotlib.use("agg")
+    for module in (
+        "numpy",
+        "h5py",
+        "lxml.etree",
+        "matplotlib.pyplot",
+        "hbtools.vasp.vasp_utils",
+        "hbtools.vasp.band.bandplot",
+        "hbtools.vasp.dos.dosplot",
+        "hbtools.input.kpoints",
+    ):
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+
+
+def _run(app: typer.Typer, request: dict[str, Any], fds: list[int]) -> int:
+    """Run one request in this process with the client's cwd, env and streams."""
+    import traceback
+
+    import matplotlib.pyplot as plt
+
+    saved_fds = [os.dup(i) for i in range(3)]
+    saved_env, saved_cwd, saved_argv = dict(os.environ), os.getcwd(), sys.argv
+    code: int = 0
+    try:
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+        os.environ.clear()
+        os.environ.update(request["env"])
+        # requests run in the daemon, figures must never open a window
+        os.environ["MPLBACKEND"] = "agg"
+        os.chdir(request["cwd"])
+        sys.argv = ["hb", *request["argv"]]
+        try:
+            app(args=request["argv"], prog_name="hb")
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                code = e.code
+            elif e.code is not None:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except Exception:
+            traceback.print_exc()
+            code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        plt.close("all")
+        for target, fd in enumerate(saved_fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        for fd in fds:
+            os.close(fd)
+        os.environ.clear()
+        os.environ.update(saved_env)
+        os.chdir(saved_cwd)
+        sys.argv = saved_argv
+    return code
+
+
+def serve(
+    cache_size: Annotated[
+        int, typer.Option("--cache-size", "-c", help="vasp files kept in memory")
+    ] = 16,
+):
+    """run a daemon that executes hb commands one at a time with warm imports"""
+    import rich
+
+    from . import register_all
+    from .vasp.dataread import readers
+
+    app = register_all()
+    _warm_up()
+    readers.resize(cache_size)
+
+    path = socket_path()
+    if "HB_SOCKET" not in os.environ and not os.environ.get("XDG_RUNTIME_DIR"):
+        path.parent.mkdir(mode=0o700, exist_ok=True)
+        if not _private(path.parent):
+            rich.print(f"[red]{path.parent} is not a private directory[/red]")
+            raise typer.Exit(1)
+    path.unlink(missing_ok=True)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        # no moment where the socket is open to others
+        umask = os.umask(0o177)
+        try:
+            server.bind(str(path))
+        finally:
+            os.umask(umask)
+        server.listen()
+        rich.print(f"hb daemon listening on [blue]{path}[/blue]")
+        try:
+            while True:
+                conn, _ = server.accept()
+                with conn:
+                    message, fds, _, _ = socket.recv_fds(conn, 1 << 20, 3)
+                    # read the rest of a long request
+                    while chunk := conn.recv(1 << 20):
+                        message += chunk
+                    code = _run(app, json.loads(message), fds)
+                    conn.sendall(json.dumps({"code": code}).encode())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            path.unlink(missing_ok=True)
@@ -146,6 +146,17 @@ class FigSetBase:
         ),
     ] = "figure.png"
 
+    workers: Annotated[
+        int,
+        typer.Option(
+            "--workers",
+            "-j",
+            min=0,
+            help="processes for saving many files into a directory, 0 for one per cpu",
+            rich_help_panel="figure set",
+        ),
+    ] = 1
+
     from_cli: Annotated[
         bool,
         typer.Option(
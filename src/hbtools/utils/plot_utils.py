@@ -202,6 +202,32 @@ class HeatSet:
 class FigPlotBase:
     def __init__(self, params: FigSetBase, fig: figure.Figure, ax: axes.Axes): ...
 
+    @classmethod
+    def prefetch(cls, params: FigSetBase, files: list[str], cache_size: int):
+        """Start loading the data of ``files`` while another file is shown."""
+
+
+# files loaded ahead on each side while browsing many files
+PREFETCH = 2
+
+
+def select_backend(show: bool):
+    """Agg unless the figure is shown on a display, so saving never loads Qt.
+
+    A backend chosen with ``MPLBACKEND`` is kept.
+    """
+    import os
+    import sys
+
+    import matplotlib
+
+    if os.environ.get("MPLBACKEND"):
+        return
+    has_display = sys.platform in ("darwin", "win32") or bool(
+        os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY")
+    )
+    matplotlib.use("qtagg" if show and has_display else "agg")
+
 
 def set_style(rc_file: Path | None = None):
     from importlib import resources
@@ -290,6 +316,13 @@ def plot_series(plot_cls: type[FigPlotBase], params: FigSetBase):
 
         def update_figure(files: list[Path], params: "FigSetBase", index: int,path_title:bool):
             params.file = str(files[index])
+            # the files next to the shown one are the likely next key presses
+            neighbours = [
+                str(files[(index + step) % num_figures])
+                for distance in range(1, PREFETCH + 1)
+                for step in (distance, -distance)
+            ]
+            plot_cls.prefetch(params, neighbours, 2 * PREFETCH + 2)
             ax.clear()
             render_and_save(plot_cls, params, fig, ax)
             if path_title == True:
@@ -320,7 +353,106 @@ def plot_series(plot_cls: type[FigPlotBase], params: FigSetBase):
         from tqdm import tqdm
 
         savedir.mkdir(exist_ok=True)
+        if params.workers != 1:
+            return export_series(plot_cls, params, files, savedir)
         for file in tqdm(files, desc="Saving figures"):
             params.file = str(file)
             params.save = f"{savedir}/{file}.png"
+            _set_export_dir(params, savedir, file)
             render_and_save(plot_cls, params, None, None)
+
+
+def _set_export_dir(params: FigSetBase, savedir: Path, file: Path):
+    """Data exported for one file of a series goes next to its figure, so the
+    files saved in one run never overwrite each other's data."""
+    if hasattr(params, "export_dir"):
+        setattr(params, "export_dir", savedir / f"{file}_data")
+
+
+def _init_export_worker(rc_file: Path | None):
+    import matplotlib
+
+    matplotlib.use("agg")
+    set_style(rc_file)
+
+
+def _export_figure(
+    plot_cls: type[FigPlotBase], params: FigSetBase, savefile: str
+) -> tuple[str, float, str | None]:
+    """Draw and save one figure in a worker, return (file, seconds, error)."""
+    import time
+
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    fig, ax = plt.subplots()
+    try:
+        Path(savefile).parent.mkdir(parents=True, exist_ok=True)
+        plot_cls(params, fig, ax)
+        fig.savefig(savefile)
+    except Exception as e:
+        return (params.file, time.perf_counter() - start, f"{type(e).__name__}: {e}")
+    finally:
+        plt.close(fig)
+    return (params.file, time.perf_counter() - start, None)
+
+
+def export_series(
+    plot_cls: type[FigPlotBase], params: FigSetBase, files: list[Path], savedir: Path
+):
+    """Save ``{savedir}/{file}.png`` for every file in a pool of Agg workers.
+
+    The drawing time of every file is printed, exits with code 1 when any
+    file failed.
+    """
+    import dataclasses
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    import rich
+    import typer
+    from tqdm import tqdm
+
+    def file_params(file: Path) -> FigSetBase:
+        replaced = dataclasses.replace(params, file=str(file), show=False)
+        _set_export_dir(replaced, savedir, file)
+        return replaced
+
+    workers = params.workers or None
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_export_worker,
+        initargs=(params.matplotlibrc,),
+    ) as executor:
+        futures = [
+            executor.submit(
+                _export_figure,
+                plot_cls,
+                file_params(file),
+                f"{savedir}/{file}.png",
+            )
+            for file in files
+        ]
+        results = [
+            future.result()
+            for future in tqdm(
+                as_completed(futures), total=len(futures), desc="Saving figures"
+            )
+        ]
+
+    order = {str(file): i for i, file in enumerate(files)}
+    results.sort(key=lambda result: order[result[0]])
+    for file, seconds, error in results:
+        status = "[green]saved[/green] " if error is None else "[red]failed[/red]"
+        rich.print(f"{status} {seconds:6.2f} s  {file}")
+
+    failed = [result for result in results if result[2] is not None]
+    total = sum(result[1] for result in results)
+    rich.print(
+        f"saved [orange1]{len(results) - len(failed)}[/orange1] figures, "
+        f"{total:.1f} s of drawing, slowest {max(r[1] for r in results):.1f} s"
+    )
+    for file, _, error in failed:
+        rich.print(f"[red]failed[/red] {file}: {error}")
+    if failed:
+        raise typer.Exit(1)
+    return results
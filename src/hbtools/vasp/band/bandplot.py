@@ -1,6 +1,6 @@
-import itertools
 import sys
 from functools import cached_property
+from typing import Any
 
 import matplotlib as mpl
 import numpy as np
@@ -10,20 +10,31 @@ from matplotlib.collections import LineCollection
 
 from ...utils import plot_utils
 from .. import vasp_utils
-from ..dataread import ReadVaspout, ReadVasprun
+from ..dataread import ReadVaspout, ReadVasprun, readers
 from .params import BandParams
 
 
 class BandData(ReadVaspout, ReadVasprun):
     def __init__(self, params: BandParams):
         self.params = params
-        if self.params.vaspfileformat == "h5":
-            self.reader = ReadVaspout(self.params.file, auto_select_k=True)
-        else:
-            self.reader = ReadVasprun(self.params.file, auto_select_k=True)
+        self.reader = readers.open(
+            self.params.file, self.params.vaspfileformat, auto_select_k=True
+        )
 
+        self.band_order: npt.NDArray[np.integer] | None = None
         if self.params.fix_order:
-            self.eigenvalues = np.sort(self.eigenvalues, axis=2)
+            features = None
+            if self.params.pro_atoms_orbitals is not None:
+                # character of every state on each ion
+                nspin = len(self.reader.eigenvalues)
+                features = self.reader.projected[:nspin].sum(axis=2)
+                features = features.transpose(0, 2, 3, 1)
+            self.band_order = vasp_utils.band_order(
+                self.reader.eigenvalues, features, self.kpoints_division
+            )
+            self.eigenvalues = np.take_along_axis(
+                self.reader.eigenvalues, self.band_order, axis=2
+            )
 
         if self.params.export:
             self.save()
@@ -32,16 +43,12 @@ class BandData(ReadVaspout, ReadVasprun):
         return getattr(self.reader, name)
 
     @cached_property
-    def xlist(self) -> list[float]:
-        kpoints_real = [np.dot(kpoint, self.rec_cell) for kpoint in self.kpoints]
+    def kpath(self) -> vasp_utils.KPath:
+        return vasp_utils.KPath(self.kpoints, self.rec_cell, self.kpoints_division)
 
-        length = (
-            np.linalg.norm(kpoint1 - kpoint2)
-            for kpoint1, kpoint2 in zip(
-                kpoints_real, kpoints_real[0:1] + list(kpoints_real)[:-1]
-            )
-        )
-        return [float(i) * np.pi * 2 for i in itertools.accumulate(length)]
+    @cached_property
+    def xlist(self) -> npt.NDArray[np.floating]:
+        return self.kpath.xlist
 
     @cached_property
     def ylist(self) -> npt.NDArray[np.floating]:
@@ -54,24 +61,28 @@ class BandData(ReadVaspout, ReadVasprun):
     def proarray_list(self) -> list[npt.NDArray[np.floating]]:
         if self.params.pro_atoms_orbitals is None:
             return []
-        self.projected
-        return [
-            np.sum(
-                [
-                    self.projected[:, atom, orbital, :, :]
-                    for atom, orbital in vasp_utils.ParsePro(
-                        self,
-                        atom_orbital_str,
-                        self.params.colors.split()[i],
-                        i,
-                    ).result
-                ],
-                axis=0,
+        proarray_list = [
+            self.reader.project(
+                vasp_utils.ParsePro(
+                    self.reader,
+                    atom_orbital_str,
+                    self.params.colors.split()[i],
+                    i,
+                ).mask
             )
             for i, atom_orbital_str in enumerate(self.params.pro_atoms_orbitals)
         ]
+        if self.band_order is None:
+            return proarray_list
+        # noncollinear runs share the order of their only spin
+        spins = np.minimum(np.arange(len(proarray_list[0])), len(self.band_order) - 1)
+        order = self.band_order[spins]
+        return [np.take_along_axis(pro, order, axis=2) for pro in proarray_list]
 
     def save(self):
+        self.params.export_dir.mkdir(parents=True, exist_ok=True)
+        if self.params.export_format != "txt":
+            return self.save_binary(f"band.{self.params.export_format}")
         filenames = ["band_up.txt", "band_down.txt"]
         for i, eigen in enumerate(self.eigenvalues):
             self.save_band(filenames[i], eigen)
@@ -83,36 +94,149 @@ class BandData(ReadVaspout, ReadVasprun):
         eigen: npt.NDArray[np.floating],
         weight: npt.NDArray[np.floating] | None = None,
     ):
-        with open(filename, "w") as f:
-            for i in range(eigen.shape[1]):  # 遍历每条能带
-                if weight is None:
-                    data = np.column_stack((self.xlist, eigen[:, i]))
-                else:
-                    data = np.column_stack((self.xlist, eigen[:, i], weight[:, i]))
-
-                np.savetxt(f, data, fmt="%.10f")
-                f.write("\n")
+        write_band_text(
+            str(self.params.export_dir / filename), self.xlist, eigen, weight
+        )
 
     def save_pro_band(self):
-        spins: list[int] = []
         if self.params.spin is None:
-            if len(self.eigenvalues) == 1:
-                spins = [0]
-            elif len(self.eigenvalues) == 2:
-                spins = [0, 1]
-            elif len(self.eigenvalues) == 4:
-                spins[0]
+            spins = list(range(len(self.eigenvalues)))
         else:
-            spin = [self.params.spin]
+            spins = [self.params.spin]
 
         for spin in spins:
-            eigen = self.eigenvalues[int(spin)]
+            # the projections of noncollinear runs all belong to one spin
+            eigen = self.eigenvalues[min(spin, len(self.eigenvalues) - 1)]
             for i, pro in enumerate(self.proarray_list):
-                weight = pro[spin]
-                self.save_band(f"fatband_spin{spin}_{i}.txt", eigen, weight)
+                self.save_band(f"fatband_spin{spin}_{i}.txt", eigen, pro[spin])
+
+    def save_binary(self, filename: str):
+        """All spins, bands and projections in one npz or HDF5 file."""
+        arrays: dict[str, Any] = {
+            "xlist": np.asarray(self.xlist),
+            "eigenvalues": np.asarray(self.eigenvalues),
+            "fermi": np.array(self.fermi),
+        }
+        if self.proarray_list:
+            arrays["projections"] = np.stack(self.proarray_list)
+            arrays["selections"] = np.array(self.params.pro_atoms_orbitals, dtype="S")
+
+        path = self.params.export_dir / filename
+        if filename.endswith(".npz"):
+            np.savez(path, **arrays)
+        else:
+            import h5py  # pyright: ignore[reportMissingTypeStubs]
+
+            with h5py.File(path, "w") as f:
+                for name, array in arrays.items():
+                    f.create_dataset(name, data=array)
+
+
+def write_band_text(
+    filename: str,
+    xlist: npt.NDArray[np.floating],
+    eigen: npt.NDArray[np.floating],
+    weight: npt.NDArray[np.floating] | None = None,
+    chunk_rows: int = 1 << 16,
+):
+    """Write bands as ``x energy [weight]`` blocks separated by blank lines.
+
+    Each group of whole bands up to ``chunk_rows`` rows is formatted by a single
+    ``%`` over one format string, which gives the same text as ``np.savetxt``
+    per band while keeping the memory bounded for large files.
+    """
+    columns = [np.broadcast_to(np.asarray(xlist)[:, None], eigen.shape), eigen]
+    if weight is not None:
+        columns.append(weight)
+    row = " ".join(["%.10f"] * len(columns)) + "\n"
+    nkpoints, nbands = eigen.shape
+    block = row * nkpoints + "\n"
+    step = max(1, chunk_rows // max(nkpoints, 1))
+    with open(filename, "w") as f:
+        for start in range(0, nbands, step):
+            # shape (bands in chunk, nkpoints, ncolumns)
+            data = np.stack([c[:, start : start + step] for c in columns], axis=-1)
+            data = data.transpose(1, 0, 2)
+            f.write(block * data.shape[0] % tuple(data.ravel().tolist()))
+
+
+def band_segments(
+    xlist: npt.NDArray[np.floating], ylist: npt.NDArray[np.floating]
+) -> npt.NDArray[np.floating]:
+    """Line segments of all bands for a LineCollection.
+
+    Every k-point interval is split at its midpoint, so each half segment can
+    take the projection of its nearest k-point.
+
+    Returns
+    -------
+    numpy.ndarray, shape (nspin * nbands * (2 * nkpoints - 2), 2, 2)
+    """
+    xlist = np.asarray(xlist)
+    nspin, nkpoints, nbands = ylist.shape
+    x = np.empty(2 * nkpoints - 1)
+    x[0::2] = xlist
+    x[1::2] = (xlist[:-1] + xlist[1:]) / 2
+    # shape (nspin, nbands, 2 * nkpoints - 1)
+    y = np.empty((nspin, nbands, 2 * nkpoints - 1))
+    y[:, :, 0::2] = ylist.transpose(0, 2, 1)
+    y[:, :, 1::2] = (y[:, :, 0:-2:2] + y[:, :, 2::2]) / 2
+
+    segments = np.empty((nspin, nbands, 2 * nkpoints - 2, 2, 2))
+    segments[..., 0, 0] = x[:-1]
+    segments[..., 1, 0] = x[1:]
+    segments[..., 0, 1] = y[:, :, :-1]
+    segments[..., 1, 1] = y[:, :, 1:]
+    return segments.reshape(-1, 2, 2)
+
+
+def cull_bands(
+    y: npt.NDArray[np.floating], yrange: tuple[float, float]
+) -> npt.NDArray[np.floating]:
+    """Keep the bands of ``y`` (nkpoints, nbands) that reach into ``yrange``."""
+    ymin, ymax = yrange
+    return y[:, (y.max(axis=0) >= ymin) & (y.min(axis=0) <= ymax)]
+
+
+def decimate_bands(
+    x: npt.NDArray[np.floating], y: npt.NDArray[np.floating], columns: int
+) -> tuple[npt.NDArray[np.floating], npt.NDArray[np.floating]]:
+    """Reduce bands to a minimum and a maximum point per pixel column.
+
+    ``x`` is sorted, so the k-points of a column are contiguous and
+    ``np.minimum.reduceat`` gives the extrema of all bands at once. The two
+    points of a column are ordered along the band so the line stays
+    continuous, which keeps the drawn curve unchanged at this resolution.
+    """
+    if len(x) <= 2 * columns:
+        return x, y
+    edges = np.linspace(x[0], x[-1], columns + 1)[:-1]
+    starts = np.unique(np.searchsorted(x, edges, side="left"))
+    ends = np.append(starts[1:], len(x)) - 1
+
+    low = np.minimum.reduceat(y, starts, axis=0)
+    high = np.maximum.reduceat(y, starts, axis=0)
+    rising = y[ends] >= y[starts]
+    first = np.where(rising, low, high)
+    second = np.where(rising, high, low)
+
+    x_columns = np.stack((x[starts], x[ends]), axis=1).reshape(-1)
+    y_columns = np.stack((first, second), axis=1).reshape(-1, y.shape[1])
+    return x_columns, y_columns
 
 
 class BandPlot(plot_utils.FigPlotBase):
+    @classmethod
+    def prefetch(cls, params: plot_utils.FigSetBase, files: list[str], cache_size: int):
+        assert isinstance(params, BandParams)
+        readers.resize(max(readers.maxsize, cache_size))
+        readers.prefetch(
+            files,
+            params.vaspfileformat,
+            auto_select_k=True,
+            warm=("eigenvalues", "kpoints", "fermi"),
+        )
+
     def __init__(
         self,
         params: BandParams,
@@ -127,12 +251,12 @@ class BandPlot(plot_utils.FigPlotBase):
         self.fermi = (
             self.data.fermi if self.params.efermi is None else self.params.efermi
         )
-        self.gaps = vasp_utils.get_gap(
-            self.data.eigenvalues,
-            self.fermi,
-            self.data.kpoints,
-            True,
+        # edges need the energy order of vasp, --fix-order only changes lines
+        self.edges = vasp_utils.band_edges(
+            self.data.reader.eigenvalues, self.fermi, self.data.kpoints
         )
+        vasp_utils.print_band_edges(self.edges, self.fermi)
+        self.gaps = [edge.gap for edge in self.edges]
         self.fig_set()
         if self.params.pro_atoms_orbitals is None:
             self.plot_band()
@@ -151,39 +275,40 @@ class BandPlot(plot_utils.FigPlotBase):
 
     def fig_set(self):
         BandAxesSet(self.ax, self.params, self.data)
-        #y_major_tick_size = mpl.rcParams["ytick.major.size"]
+        # y_major_tick_size = mpl.rcParams["ytick.major.size"]
         self.ax.axhline(
             0,
             ls="dashed",
-            #ls=(0, (y_major_tick_size, y_major_tick_size)),
+            # ls=(0, (y_major_tick_size, y_major_tick_size)),
             c="black",
             lw=mpl.rcParams["ytick.major.width"],
             zorder=0,
         )
 
     @cached_property
-    def lc(self) -> LineCollection:
-        y_repeat = self.data.ylist.repeat(2, axis=1)
-        yarray = (y_repeat[:, :-1, :] + y_repeat[:, 1:, :]) / 2
-        ylist_left = yarray[:, :-1, :].transpose(0, 2, 1).reshape(-1)
-        ylist_right = yarray[:, 1:, :].transpose(0, 2, 1).reshape(-1)
-
-        x_repeat = np.array(self.data.xlist).repeat(2)
-        xarray = (x_repeat[:-1] + x_repeat[1:]) / 2
-        xlist_left = np.array(
-            list(xarray[:-1]) * self.data.ylist.shape[0] * self.data.ylist.shape[2]
-        )
-        xlist_right = np.array(
-            list(xarray[1:]) * self.data.ylist.shape[0] * self.data.ylist.shape[2]
-        )
-
-        left = np.stack((xlist_left, xlist_right), axis=1)
-        right = np.stack((ylist_left, ylist_right), axis=1)
-
-        segments = np.stack((left, right), axis=2)
-        lc = LineCollection(list(segments), rasterized=True)
-
-        return lc
+    def segments(self) -> npt.NDArray[np.floating]:
+        return band_segments(self.data.xlist, self.data.ylist)
+
+    def visible_band(
+        self, y: npt.NDArray[np.floating]
+    ) -> tuple[npt.NDArray[np.floating], npt.NDArray[np.floating]]:
+        """Cull and decimate the bands of one spin before ``ax.plot``."""
+        x = np.asarray(self.data.xlist)
+        if self.params.clip_yrange and self.params.yrange is not None:
+            y = cull_bands(y, self.params.yrange)
+        if self.params.decimate:
+            x, y = decimate_bands(x, y, self.pixel_columns(x))
+        return x, y
+
+    def pixel_columns(self, x: npt.NDArray[np.floating]) -> int:
+        """Pixel columns spanned by ``x`` at the finer of the screen and the
+        save resolution, when the axes show only the current x limits."""
+        dpi = mpl.rcParams["savefig.dpi"]
+        dpi = max(self.fig.dpi, self.fig.dpi if dpi == "figure" else float(dpi))
+        width = self.ax.get_window_extent().width / self.fig.dpi * dpi
+        xmin, xmax = self.ax.get_xlim()
+        span = (x[-1] - x[0]) / max(abs(xmax - xmin), 1e-12)
+        return max(int(np.ceil(width * span)), 1)
 
     def plot_band(self):
         labels = (
@@ -192,16 +317,14 @@ class BandPlot(plot_utils.FigPlotBase):
         if self.params.spin is None:
             for i, y in enumerate(self.data.ylist):
                 self.ax.plot(
-                    self.data.xlist,
-                    y,
+                    *self.visible_band(y),
                     c=self.params.colors.split()[i],
                     zorder=2,
                     label=labels[i],
                 )
         else:
             self.ax.plot(
-                self.data.xlist,
-                self.data.ylist[self.params.spin],
+                *self.visible_band(self.data.ylist[self.params.spin]),
                 c=self.params.colors.split()[0],
                 zorder=2,
                 label=labels[self.params.spin],
@@ -215,8 +338,10 @@ class BandPlot(plot_utils.FigPlotBase):
             self.scatter_proplot()
 
     def scatter_proplot(self):
+        # 4 spin components (total, mx, my, mz) for noncollinear runs
+        nspin_pro = len(self.data.proarray_list[0])
         scatter_xlist = np.tile(
-            self.data.xlist, (len(self.data.projected), self.data.nbands, 1)
+            self.data.xlist, (nspin_pro, self.data.nbands, 1)
         ).transpose(0, 2, 1)
         assert self.params.pro_atoms_orbitals is not None
 
@@ -235,7 +360,7 @@ class BandPlot(plot_utils.FigPlotBase):
             else:
                 ec = fc = self.params.colors.split()[i]
 
-            if self.params.spin is not None and len(self.data.projected) == 4:
+            if self.params.spin is not None and nspin_pro == 4:
                 self.ax.scatter(
                     scatter_xlist[self.params.spin],
                     self.data.ylist[0],
@@ -244,7 +369,7 @@ class BandPlot(plot_utils.FigPlotBase):
                     fc=fc,
                     label=labels[i],
                 )
-            elif self.params.spin is not None and len(self.data.projected) != 4:
+            elif self.params.spin is not None and nspin_pro != 4:
                 self.ax.scatter(
                     scatter_xlist[self.params.spin],
                     self.data.ylist[self.params.spin],
@@ -253,7 +378,7 @@ class BandPlot(plot_utils.FigPlotBase):
                     fc=fc,
                     label=labels[i],
                 )
-            elif self.params.spin is None and len(self.data.projected) == 4:
+            elif self.params.spin is None and nspin_pro == 4:
                 self.ax.scatter(
                     scatter_xlist[0],
                     self.data.ylist[0],
@@ -277,16 +402,32 @@ class BandPlot(plot_utils.FigPlotBase):
             print("LineCollection only support 1 pro")
             sys.exit()
         proarray = self.data.proarray_list[0]
+        # shape (nspin, nbands * (2 * nkpoints - 2), 2, 2)
+        segments = self.segments.reshape(len(self.data.ylist), -1, 2, 2)
 
         if self.params.spin is not None:
             proarray = proarray[self.params.spin : self.params.spin + 1]
-        elif len(self.data.projected) == 2:
-            proarray[1] = -proarray[1]
+            # the noncollinear components all belong to the only spin
+            spin = min(self.params.spin, len(segments) - 1)
+            segments = segments[spin : spin + 1]
+        elif len(proarray) == 2:
+            # spin down below the axis, without touching the cached projection
+            proarray = proarray * np.array([1, -1])[:, None, None]
         else:
             proarray = proarray[0:1, :, :]
+            segments = segments[0:1]
+        segments = segments.reshape(-1, 2, 2)
 
         points_repeat = proarray.repeat(2, axis=1)[:, 1:-1, :]
         lc_array = points_repeat.transpose(0, 2, 1).reshape(-1)
+        if self.params.clip_yrange and self.params.yrange is not None:
+            ymin, ymax = self.params.yrange
+            y = segments[:, :, 1]
+            keep = (y.max(axis=1) >= ymin) & (y.min(axis=1) <= ymax)
+            segments = segments[keep]
+            lc_array = lc_array[keep]
+        # built from the drawn segments only, the others never become paths
+        self.lc = LineCollection(segments, rasterized=True)  # type: ignore
         if self.params.vrange is None:
             pmin = lc_array.min()
             pmax = lc_array.max()
@@ -332,7 +473,7 @@ class BandAxesSet(plot_utils.AxesSet):
                 # TODO
                 xticks = []
             else:
-                xticks = ([0.0] + self.data.xlist)[:: self.data.kpoints_division]
+                xticks = list(self.data.kpath.ticks)
         if self.params.xticklabels is not None:
             xticklabels = self.params.xticklabels.split()
         else:
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from pathlib import Path
 from typing import Annotated
 
 import click
@@ -48,7 +49,10 @@ class BandParams(HeatFigBase, FigSetBase):
 
     fix_order: Annotated[
         bool,
-        typer.Option(help="reorder band for vasp give the wrong order when ncore > 1"),
+        typer.Option(
+            help="reorder bands along the k-path, following crossings by slope "
+            "(and projections with -p); also fixes the vasp order when ncore > 1"
+        ),
     ] = False
 
     xrange: Annotated[
@@ -97,6 +101,23 @@ class BandParams(HeatFigBase, FigSetBase):
         ),
     ] = "red blue"
 
+    clip_yrange: Annotated[
+        bool,
+        typer.Option(
+            "--clip-yrange/--no-clip-yrange",
+            help="drop bands and band segments outside yrange before drawing",
+            rich_help_panel="figure set",
+        ),
+    ] = False
+    decimate: Annotated[
+        bool,
+        typer.Option(
+            "--decimate/--no-decimate",
+            help="keep only the min and max of every pixel column for dense k-paths",
+            rich_help_panel="figure set",
+        ),
+    ] = False
+
     # -----------------------------------------------
 
     scale: Annotated[
@@ -136,3 +157,20 @@ class BandParams(HeatFigBase, FigSetBase):
     export: Annotated[
         bool, typer.Option("--export/--noexport", help="whether export band data")
     ] = True
+
+    export_dir: Annotated[
+        Path,
+        typer.Option(
+            "--export-dir",
+            help="directory of the exported band data",
+        ),
+    ] = Path(".")
+
+    export_format: Annotated[
+        str,
+        typer.Option(
+            "--export-format",
+            click_type=click.Choice(["txt", "npz", "h5"]),
+            help="txt files per spin and projection, or one band.npz / band.h5",
+        ),
+    ] = "txt"
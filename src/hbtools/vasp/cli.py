@@ -15,9 +15,9 @@ app = typer.Typer(no_args_is_help=True)
 @dataclass_cli
 def band(params: BandParams):
     from ..utils import plot_utils
+
+    plot_utils.select_backend(params.show)
     from .band.bandplot import BandPlot
-    import matplotlib
-    matplotlib.use("qtagg")
 
     return plot_utils.plot_series(BandPlot, params)
 
@@ -28,9 +28,9 @@ def dos(
     params: DosParams,
 ):
     from ..utils import plot_utils
+
+    plot_utils.select_backend(params.show)
     from .dos.dosplot import DosPlot
-    import matplotlib
-    matplotlib.use("qtagg")
 
     return plot_utils.plot_series(DosPlot, params)
 
@@ -53,26 +53,36 @@ def nbands_ewin(
     file: Annotated[Path, typer.Argument(exists=True)] = Path("vaspout.h5"),
     fermi: Annotated[float, typer.Option("--fermi", "-f")] = 0,
     spin: Annotated[int, typer.Option("--spin", "-s", min=0, max=1)] = 0,
+    scan: Annotated[
+        tuple[float, float, float] | None,
+        typer.Option(
+            "--scan",
+            help="sweep the upper edge of the window: start stop step",
+        ),
+    ] = None,
 ):
+    import numpy as np
     import rich
+    from rich.table import Table
 
-    from .dataread import ReadVaspout, ReadVasprun
+    from .dataread import readers
+    from .vasp_utils import BandWindow
 
-    if vaspfileformat == "h5":
-        eigenvalues = ReadVaspout(file).eigenvalues[spin] - fermi
-    else:
-        eigenvalues = ReadVasprun(file).eigenvalues[spin] - fermi
+    eigenvalues = readers.open(file, vaspfileformat).eigenvalues - fermi
+    window = BandWindow(eigenvalues)
 
     emin, emax = energy_windows
-    band_max = eigenvalues.max(axis=0)
-    band_min = eigenvalues.min(axis=0)
-    band_out = 0
-    band_in = 0
-    for b_min, b_max in zip(band_min, band_max):
-        if b_min > emin and b_max < emax:
-            band_in += 1
-        elif (b_min < emin and b_max > emin) or (b_min < emax and b_max > emax):
-            band_out += 1
+    if scan is not None:
+        start, stop, step = scan
+        emaxs = np.arange(start, stop + step / 2, step)
+        band_in, band_out = window.count(emin, emaxs, spin)
+        table = Table("emin", "emax", "fully in", "partly in")
+        for top, n_in, n_out in zip(emaxs, band_in, band_out):
+            table.add_row(f"{emin:.3f}", f"{top:.3f}", str(n_in), str(n_out))
+        rich.print(table)
+        return
+
+    band_in, band_out = window.count(emin, emax, spin)
     rich.print(
         f"the num of bands fully in your give energy window for spin {spin} is [orange1]{band_in}"
     )
@@ -81,9 +91,30 @@ def nbands_ewin(
     )
 
 
+def _expand_runs(files: list[Path] | None, filename: str) -> list[Path]:
+    """Files and run directories, quoted globs are expanded here."""
+    import glob
+
+    if not files:
+        files = [Path(filename)]
+    paths: list[Path] = []
+    for file in files:
+        if file.exists():
+            paths.append(file)
+        else:
+            matches = sorted(glob.glob(str(file), recursive=True))
+            if matches == []:
+                raise typer.BadParameter(f"{file} does not exist")
+            paths.extend(Path(i) for i in matches)
+    return paths
+
+
 @app.command("gap")
 def gap(
-    file: Annotated[Path, typer.Argument(exists=True)] = Path("vaspout.h5"),
+    files: Annotated[
+        list[Path] | None,
+        typer.Argument(help="files, run directories or quoted globs"),
+    ] = None,
     vaspfileformat: Annotated[
         str,
         typer.Option(
@@ -101,20 +132,147 @@ def gap(
             "-v",
         ),
     ] = None,
+    table: Annotated[
+        str | None,
+        typer.Option(
+            "--table",
+            "-t",
+            click_type=click.Choice(["csv", "json"]),
+            help="print a table instead of a panel, the default for many files",
+        ),
+    ] = None,
+    workers: Annotated[
+        int,
+        typer.Option(
+            "--workers",
+            "-j",
+            min=0,
+            help="worker processes for many files, 0 for one per cpu",
+        ),
+    ] = 0,
 ):
+    import sys
+
     from ..vasp.vasp_utils import get_gap
-    from .dataread import ReadVaspout, ReadVasprun
+    from .dataread import VaspDataset, readers
 
-    if vaspfileformat == "h5":
-        data = ReadVaspout(file)
-    else:
-        data = ReadVasprun(file)
+    filename = "vaspout.h5" if vaspfileformat == "h5" else "vasprun.xml"
+    paths = _expand_runs(files, filename)
 
     if vbms_str is not None:
         vbms = [int(i) for i in vbms_str.split()]
     else:
         vbms = None
-    get_gap(data.eigenvalues, data.fermi, data.kpoints, True, vbms)
+
+    if table is None and len(paths) == 1 and not paths[0].is_dir():
+        data = readers.open(paths[0], vaspfileformat)
+        get_gap(data.eigenvalues, data.fermi, data.kpoints, True, vbms)
+        return
+
+    dataset = VaspDataset(
+        paths, filename=filename, workers=workers or None, dos=False, vbms=vbms
+    )
+    dataset.write_table(sys.stdout, table or "csv")
+
+
+@app.command("dband")
+def dband(
+    files: Annotated[
+        list[Path] | None,
+        typer.Argument(help="files, run directories or quoted globs"),
+    ] = None,
+    vaspfileformat: Annotated[
+        str,
+        typer.Option(
+            "-vf",
+            "--vaspfileformat",
+            click_type=click.Choice(["h5", "xml"]),
+            envvar="MXMF_VASPFILE_FORMAT",
+            help="read file format.",
+        ),
+    ] = "h5",
+    pro_atoms_orbitals: Annotated[
+        list[str] | None,
+        typer.Option(
+            "--pro-atoms-orbitals",
+            "-p",
+            help="projected atoms and orbitals, all:d by default",
+        ),
+    ] = None,
+    per_atom: Annotated[
+        bool,
+        typer.Option("--per-atom", help="one row for every atom of a selection"),
+    ] = False,
+    erange: Annotated[
+        tuple[float, float] | None,
+        typer.Option(
+            "--erange", "-er", help="energy window relative to the fermi level"
+        ),
+    ] = None,
+    spin: Annotated[
+        int | None,
+        typer.Option(
+            "--spin", "-s", help="only this spin of collinear runs, summed by default"
+        ),
+    ] = None,
+    table: Annotated[
+        str | None,
+        typer.Option(
+            "--table",
+            "-t",
+            click_type=click.Choice(["csv", "json"]),
+            help="print csv or json instead of a table, the default for many files",
+        ),
+    ] = None,
+    workers: Annotated[
+        int,
+        typer.Option(
+            "--workers",
+            "-j",
+            min=0,
+            help="worker processes for many files, 0 for one per cpu",
+        ),
+    ] = 0,
+):
+    """d-band center, width, skewness, kurtosis and filling from the partial DOS"""
+    import sys
+    from functools import partial
+
+    import rich
+    from rich.table import Table
+
+    from .dataread.batch import (
+        DBAND_COLUMNS,
+        map_runs,
+        read_dband,
+        run_files,
+        write_rows,
+    )
+
+    filename = "vaspout.h5" if vaspfileformat == "h5" else "vasprun.xml"
+    paths = run_files(_expand_runs(files, filename), filename)
+    read = partial(
+        read_dband,
+        selections=pro_atoms_orbitals or ["all:d"],
+        per_atom=per_atom,
+        erange=erange,
+        spin=spin,
+    )
+    rows = [row for result in map_runs(read, paths, workers or None) for row in result]
+
+    if table is not None or len(paths) > 1:
+        write_rows(sys.stdout, rows, DBAND_COLUMNS, table or "csv")
+        return
+    output = Table(*DBAND_COLUMNS[1:8])
+    for row in rows:
+        if row["error"] is not None:
+            rich.print(f"[red]{row['path']}: {row['error']}")
+            raise typer.Exit(1)
+        output.add_row(
+            row["selection"],
+            *(f"{row[i]:.4f}" for i in DBAND_COLUMNS[2:8]),
+        )
+    rich.print(output)
 
 
 @app.command("vp")
@@ -141,12 +299,9 @@ def get_valley_polarization(
     point2: Annotated[int, typer.Option("--point2", "-p2", help="K-")] = 149,
 ):
     from ..vasp.vasp_utils import get_valley_polarization
-    from .dataread import ReadVaspout, ReadVasprun
+    from .dataread import readers
 
-    if vaspfileformat == "h5":
-        data = ReadVaspout(file)
-    else:
-        data = ReadVasprun(file)
+    data = readers.open(file, vaspfileformat)
 
     if vbms_str is not None:
         vbms = [int(i) for i in vbms_str.split()]
@@ -154,3 +309,46 @@ def get_valley_polarization(
         vbms = None
 
     return get_valley_polarization(data.eigenvalues, data.fermi, vbms, point1, point2)
+
+
+@app.command("cache")
+def cache(
+    root: Annotated[Path, typer.Argument(exists=True)] = Path("."),
+    prune: Annotated[
+        bool,
+        typer.Option(
+            "--prune", help="remove stale entries and evict the least recently used"
+        ),
+    ] = False,
+    max_size: Annotated[
+        str | None,
+        typer.Option(
+            "--max-size", "-m", help="size limit for --prune, e.g. 500M or 2G"
+        ),
+    ] = None,
+):
+    """list or prune the .hbcache entries of parsed vasprun.xml files"""
+    import rich
+    from rich.table import Table
+
+    from .dataread import cache as vasp_cache
+
+    if prune:
+        limit = None if max_size is None else vasp_cache.parse_size(max_size)
+        removed = vasp_cache.prune(root, limit)
+        freed = vasp_cache.format_size(sum(entry.size for entry in removed))
+        rich.print(f"removed [orange1]{len(removed)}[/orange1] entries, {freed} freed")
+
+    entries = vasp_cache.list_entries(root)
+    table = Table("cache", "source", "size", "last used", "status")
+    for entry in entries:
+        table.add_row(
+            str(entry.path),
+            str(entry.source),
+            vasp_cache.format_size(entry.size),
+            vasp_cache.format_time(entry.last_used),
+            "[red]stale" if entry.stale else "[green]valid",
+        )
+    rich.print(table)
+    total = vasp_cache.format_size(sum(entry.size for entry in entries))
+    rich.print(f"{len(entries)} entries, {total} in total")
@@ -1,5 +1,17 @@
 from .vaspdata import VaspData
 from .vaspout import ReadVaspout
 from .vasprun import ReadVasprun
+from .batch import RunResult, VaspDataset, map_runs, read_dband
+from .readers import ReaderCache, readers
 
-__all__ = ["VaspData", "ReadVaspout", "ReadVasprun"]
+__all__ = [
+    "VaspData",
+    "ReadVaspout",
+    "ReadVasprun",
+    "RunResult",
+    "VaspDataset",
+    "map_runs",
+    "read_dband",
+    "ReaderCache",
+    "readers",
+]
@@ -0,0 +1,281 @@
+"""Read many vasp calculations at once.
+
+``VaspDataset`` parses a list of files or run directories in a process pool
+and keeps a small ``RunResult`` per run, so sweeps over hundreds of runs are
+not limited by parsing one file after the other. ``map_runs`` does the same
+for any function of one run, e.g. ``read_dband``.
+"""
+
+import csv
+import json
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, TextIO, TypeVar, overload
+
+import numpy as np
+import numpy.typing as npt
+
+from .vaspdata import VaspData
+
+if TYPE_CHECKING:
+    from ..vasp_utils import BandEdges
+
+TABLE_COLUMNS = (
+    "path",
+    "spin",
+    "fermi",
+    "gap",
+    "direct",
+    "direct_gap",
+    "vbm",
+    "cbm",
+    "vbm_band",
+    "k_vbm",
+    "k_cbm",
+    "error",
+)
+DBAND_COLUMNS = (
+    "path",
+    "selection",
+    "states",
+    "center",
+    "width",
+    "skewness",
+    "kurtosis",
+    "filling",
+    "error",
+)
+
+_T = TypeVar("_T")
+
+
+@dataclass
+class RunResult:
+    """What is kept of one calculation, ``error`` is set if it couldn't be read."""
+
+    file: Path
+    fermi: float | None = None
+    edges: "list[BandEdges] | None" = None
+    eigenvalues: npt.NDArray[np.floating] | None = None
+    kpoints: npt.NDArray[np.floating] | None = None
+    dose: npt.NDArray[np.floating] | None = None
+    dos: npt.NDArray[np.floating] | None = None
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def gaps(self) -> list[float] | None:
+        return None if self.edges is None else [edge.gap for edge in self.edges]
+
+    def rows(self) -> list[dict[str, Any]]:
+        """One flat row per spin for tabular output, a single row on error."""
+        if self.edges is None:
+            row = dict.fromkeys(TABLE_COLUMNS)
+            return [row | {"path": str(self.file), "error": self.error}]
+        return [
+            {
+                "path": str(self.file),
+                "spin": edge.spin,
+                "fermi": self.fermi,
+                "gap": edge.gap,
+                "direct": edge.direct,
+                "direct_gap": edge.direct_gap,
+                "vbm": edge.vbm,
+                "cbm": edge.cbm,
+                "vbm_band": None if edge.metal else edge.nvalence,
+                "k_vbm": _kpoint_str(edge.k_vbm),
+                "k_cbm": _kpoint_str(edge.k_cbm),
+                "error": None,
+            }
+            for edge in self.edges
+        ]
+
+
+def _kpoint_str(kpoints: npt.NDArray[np.floating] | None) -> str | None:
+    """The first k-point of the edge, degenerate edges are reported once."""
+    if kpoints is None or kpoints.size == 0:
+        return None
+    return " ".join(f"{i:.6f}" for i in np.reshape(kpoints, (-1, 3))[0])
+
+
+def open_run(file: str | Path, auto_select_k: bool = False) -> VaspData:
+    """Open vaspout.h5 or vasprun.xml, the reader follows the file suffix."""
+    from .vaspout import ReadVaspout
+    from .vasprun import ReadVasprun
+
+    if Path(file).suffix == ".h5":
+        return ReadVaspout(file, auto_select_k=auto_select_k)
+    return ReadVasprun(file, auto_select_k=auto_select_k)
+
+
+def read_run(
+    file: str | Path,
+    auto_select_k: bool = False,
+    dos: bool = True,
+    vbms: list[int] | None = None,
+) -> RunResult:
+    """Read one calculation, any exception is recorded in ``RunResult.error``."""
+    from ..vasp_utils import band_edges
+
+    file = Path(file)
+    try:
+        data = open_run(file, auto_select_k)
+        eigenvalues = np.asarray(data.eigenvalues)
+        kpoints = np.asarray(data.kpoints)
+        result = RunResult(
+            file,
+            fermi=data.fermi,
+            edges=band_edges(eigenvalues, data.fermi, kpoints, vbms),
+            eigenvalues=eigenvalues,
+            kpoints=kpoints,
+        )
+        if dos:
+            result.dose = np.asarray(data.dose)
+            result.dos = np.asarray(data.dos)
+        return result
+    except Exception as e:
+        return RunResult(file, error=f"{type(e).__name__}: {e}")
+
+
+def read_dband(
+    file: str | Path,
+    selections: Sequence[str] = ("all:d",),
+    per_atom: bool = False,
+    erange: tuple[float, float] | None = None,
+    spin: int | None = None,
+) -> list[dict[str, Any]]:
+    """``DBAND_COLUMNS`` rows of the DOS moments of one run, see
+    ``vasp_utils.selection_moments``. Errors give a single row."""
+    from ..vasp_utils import selection_moments
+
+    file = Path(file)
+    try:
+        labels, moments = selection_moments(
+            open_run(file), list(selections), per_atom, erange, spin
+        )
+    except SystemExit:
+        # ParsePro exits on selections it can't parse
+        error = "invalid selection"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    else:
+        return [
+            {
+                "path": str(file),
+                "selection": label,
+                "states": float(moments.states[i]),
+                "center": float(moments.center[i]),
+                "width": float(moments.width[i]),
+                "skewness": float(moments.skewness[i]),
+                "kurtosis": float(moments.kurtosis[i]),
+                "filling": float(moments.filling[i]),
+                "error": None,
+            }
+            for i, label in enumerate(labels)
+        ]
+    return [dict.fromkeys(DBAND_COLUMNS) | {"path": str(file), "error": error}]
+
+
+def run_files(runs: Iterable[str | Path], filename: str = "vaspout.h5") -> list[Path]:
+    """Files of ``runs``, a run directory stands for its ``filename``."""
+    return [Path(run) / filename if Path(run).is_dir() else Path(run) for run in runs]
+
+
+def map_runs(
+    func: Callable[[Path], _T], files: Sequence[Path], workers: int | None = None
+) -> list[_T]:
+    """``func`` of every file in a process pool, in this process if workers == 1.
+
+    ``func`` must be picklable, e.g. a ``partial`` of a module function.
+    """
+    if workers == 1 or len(files) <= 1:
+        return [func(file) for file in files]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, files, chunksize=4))
+
+
+def write_rows(
+    stream: TextIO,
+    rows: Iterable[dict[str, Any]],
+    columns: Sequence[str],
+    fmt: str = "csv",
+):
+    """Write rows as csv or as json lines, one object per row."""
+    if fmt == "json":
+        for row in rows:
+            stream.write(json.dumps(row) + "\n")
+        return
+    writer = csv.DictWriter(stream, columns, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+class VaspDataset(Sequence[RunResult]):
+    """Results of many calculations, parsed in parallel.
+
+    Parameters
+    ----------
+    runs
+        Files, or run directories that contain ``filename``.
+    filename
+        File read in a run directory, vaspout.h5 or vasprun.xml.
+    workers
+        Number of worker processes, ``None`` for one per cpu and ``1`` to read
+        in this process.
+    """
+
+    def __init__(
+        self,
+        runs: Iterable[str | Path],
+        filename: str = "vaspout.h5",
+        workers: int | None = None,
+        auto_select_k: bool = False,
+        dos: bool = True,
+        vbms: list[int] | None = None,
+    ):
+        self.files = run_files(runs, filename)
+        read = partial(read_run, auto_select_k=auto_select_k, dos=dos, vbms=vbms)
+        self.results = map_runs(read, self.files, workers)
+
+    @classmethod
+    def from_glob(
+        cls, pattern: str = "vaspout.h5", root: str | Path = ".", **kwargs
+    ) -> "VaspDataset":
+        """Every file below ``root`` matching ``pattern``, as ``plot_series`` does."""
+        return cls(sorted(Path(root).rglob(pattern)), **kwargs)
+
+    @overload
+    def __getitem__(self, index: int) -> RunResult: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[RunResult]: ...
+
+    def __getitem__(self, index: int | slice) -> RunResult | list[RunResult]:
+        return self.results[index]
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def __iter__(self) -> Iterator[RunResult]:
+        return iter(self.results)
+
+    @property
+    def ok(self) -> list[RunResult]:
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failed(self) -> list[RunResult]:
+        return [result for result in self.results if not result.ok]
+
+    def rows(self) -> list[dict[str, Any]]:
+        return [row for result in self.results for row in result.rows()]
+
+    def write_table(self, stream: TextIO, fmt: str = "csv"):
+        """Write ``rows`` as csv or as json lines, one object per row."""
+        write_rows(stream, self.rows(), TABLE_COLUMNS, fmt)
@@ -0,0 +1,177 @@
+"""Binary sidecar cache for parsed vasp data.
+
+Parsed arrays are stored next to the source file in
+``.hbcache/<stem>.<hash>.npz``. The hash covers the resolved path, size,
+mtime and the first and last MiB of the source, so an edited or replaced
+file never hits an old entry.
+
+The cache doubles the disk use of every vasprun.xml it covers, so readers only
+use it when asked to, or when ``HB_CACHE`` is set to a non-empty value other
+than ``0``.
+"""
+
+import hashlib
+import os
+import time
+from collections.abc import Iterator, Mapping
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+CACHE_DIR = ".hbcache"
+# bump when the layout of the cached blocks changes
+CACHE_VERSION = 1
+_SAMPLE = 1 << 20
+
+
+def enabled() -> bool:
+    return os.environ.get("HB_CACHE", "0") not in ("", "0")
+
+
+def cache_key(file: str | Path) -> str:
+    file = Path(file).resolve()
+    stat = file.stat()
+    digest = hashlib.blake2b(digest_size=10)
+    digest.update(f"{CACHE_VERSION}:{file}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(file, "rb") as f:
+        digest.update(f.read(_SAMPLE))
+        if stat.st_size > _SAMPLE:
+            f.seek(max(_SAMPLE, stat.st_size - _SAMPLE))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def cache_path(file: str | Path) -> Path:
+    file = Path(file)
+    return file.parent / CACHE_DIR / f"{file.stem}.{cache_key(file)}.npz"
+
+
+class LazyNpz(Mapping[str, Any]):
+    """Read-only view of a cached npz, every member is loaded on first use."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._npz = np.load(path, allow_pickle=False)
+        self._loaded: dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._loaded:
+            value = self._npz[key]
+            self._loaded[key] = value.item() if value.ndim == 0 else value
+        return self._loaded[key]
+
+    def shape(self, key: str) -> tuple[int, ...]:
+        """Shape of a member from its npy header, without loading it."""
+        if key in self._loaded:
+            return np.shape(self._loaded[key])
+        with self._npz.zip.open(f"{key}.npy") as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, _, _ = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, _, _ = np.lib.format.read_array_header_2_0(f)
+        return shape
+
+    def __iter__(self) -> Iterator[str]:
+        return (i for i in self._npz.files if not i.startswith("__"))
+
+    def __len__(self) -> int:
+        return len(list(iter(self)))
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._npz.files
+
+
+def load(file: str | Path) -> LazyNpz | None:
+    try:
+        path = cache_path(file)
+        if not path.exists():
+            return None
+        blocks = LazyNpz(path)
+        # mark as recently used for the size based eviction
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+    return blocks
+
+
+def save(file: str | Path, blocks: Mapping[str, Any]):
+    file = Path(file)
+    try:
+        path = cache_path(file)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, __source__=np.array(file.name), **blocks)
+        os.replace(tmp, path)
+    except OSError:
+        # read-only directories simply don't get a cache
+        return
+
+
+@dataclass
+class CacheEntry:
+    path: Path
+    source: Path
+    size: int
+    last_used: float
+    stale: bool
+
+
+def list_entries(root: str | Path = ".") -> list[CacheEntry]:
+    entries: list[CacheEntry] = []
+    for path in Path(root).rglob(f"{CACHE_DIR}/*.npz"):
+        stat = path.stat()
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                source = path.parent.parent / str(npz["__source__"])
+            stale = not source.exists() or cache_path(source) != path
+        except (OSError, ValueError, KeyError):
+            source, stale = path, True
+        entries.append(CacheEntry(path, source, stat.st_size, stat.st_mtime, stale))
+    return sorted(entries, key=lambda entry: entry.last_used, reverse=True)
+
+
+def prune(root: str | Path = ".", max_size: int | None = None) -> list[CacheEntry]:
+    """Remove stale entries, then the least recently used ones until the
+    total size is at most ``max_size`` bytes."""
+    removed: list[CacheEntry] = []
+    kept: list[CacheEntry] = []
+    for entry in list_entries(root):
+        (removed if entry.stale else kept).append(entry)
+
+    if max_size is not None:
+        total = sum(entry.size for entry in kept)
+        while kept and total > max_size:
+            entry = kept.pop()
+            total -= entry.size
+            removed.append(entry)
+
+    for entry in removed:
+        entry.path.unlink(missing_ok=True)
+        if not any(entry.path.parent.iterdir()):
+            entry.path.parent.rmdir()
+    return removed
+
+
+def parse_size(size: str) -> int:
+    """Convert sizes like ``512M`` or ``2G`` to bytes."""
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    size = size.strip().upper().removesuffix("B")
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def format_size(size: float) -> str:
+    for unit in ["B", "K", "M", "G"]:
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}T"
+
+
+def format_time(timestamp: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
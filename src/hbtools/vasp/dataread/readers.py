@@ -0,0 +1,123 @@
+"""Shared readers for browsing many files and for the hb daemon.
+
+``readers`` keeps the most recently used readers and can load the next ones
+in a background thread. It stores nothing until it is resized, so scripts
+and single plots open a fresh reader as before.
+"""
+
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from .vaspdata import VaspData
+
+_Key = tuple[str, int, str, bool]
+
+
+def _key(file: str | Path, vaspfileformat: str, auto_select_k: bool) -> _Key:
+    """The modification time is part of the key, a rewritten file is reread."""
+    path = Path(file).resolve()
+    return (str(path), path.stat().st_mtime_ns, vaspfileformat, auto_select_k)
+
+
+def _load(key: _Key, warm: Iterable[str]) -> VaspData:
+    from .vaspout import ReadVaspout
+    from .vasprun import ReadVasprun
+
+    file, _, vaspfileformat, auto_select_k = key
+    if vaspfileformat == "h5":
+        data = ReadVaspout(file, auto_select_k=auto_select_k)
+    else:
+        data = ReadVasprun(file, auto_select_k=auto_select_k)
+    for name in warm:
+        getattr(data, name)
+    return data
+
+
+class ReaderCache:
+    """LRU cache of readers keyed by path, mtime, format and k-point selection."""
+
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[_Key, Future[VaspData]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+
+    def resize(self, maxsize: int):
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def open(
+        self,
+        file: str | Path,
+        vaspfileformat: str = "h5",
+        auto_select_k: bool = False,
+        warm: Iterable[str] = (),
+    ) -> VaspData:
+        key = _key(file, vaspfileformat, auto_select_k)
+        if self.maxsize <= 0:
+            return _load(key, warm)
+
+        with self._lock:
+            future = self._entries.get(key)
+            owner = future is None
+            if future is None:
+                future = Future()
+                self._insert(key, future)
+            else:
+                self._entries.move_to_end(key)
+        if owner:
+            self._run(key, future, warm)
+        try:
+            return future.result()
+        except Exception:
+            # don't keep a failed load, the next open tries again
+            with self._lock:
+                if self._entries.get(key) is future:
+                    del self._entries[key]
+            raise
+
+    def prefetch(
+        self,
+        files: Iterable[str | Path],
+        vaspfileformat: str = "h5",
+        auto_select_k: bool = False,
+        warm: Iterable[str] = (),
+    ):
+        """Load ``files`` in a background thread unless they are cached."""
+        if self.maxsize <= 0:
+            return
+        warm = tuple(warm)
+        for file in files:
+            key = _key(file, vaspfileformat, auto_select_k)
+            with self._lock:
+                if key in self._entries:
+                    continue
+                future: Future[VaspData] = Future()
+                self._insert(key, future)
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        1, thread_name_prefix="hb-prefetch"
+                    )
+            self._executor.submit(self._run, key, future, warm)
+
+    @staticmethod
+    def _run(key: _Key, future: Future[VaspData], warm: Iterable[str]):
+        try:
+            future.set_result(_load(key, warm))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _insert(self, key: _Key, future: Future[VaspData]):
+        self._entries[key] = future
+        self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+readers = ReaderCache()
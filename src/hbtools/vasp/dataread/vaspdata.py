@@ -1,10 +1,15 @@
 from abc import ABC, abstractmethod
+from collections.abc import Callable, Sequence
 from functools import cached_property
 from pathlib import Path
 
 import numpy as np
 import numpy.typing as npt
 
+# (ionnum, orbital_num) mask or weights, a stack of them with shape
+# (nselection, ionnum, orbital_num), or a list of (atom, orbital) pairs
+Selection = npt.NDArray[np.bool_] | npt.NDArray[np.floating] | Sequence[tuple[int, int]]
+
 
 class VaspData(ABC):
     def __init__(
@@ -247,4 +252,107 @@ class VaspData(ABC):
         elif "projected" in self.__dict__:
             return self.projected.shape[2]
         else:
-            return self.dospar.shape[2]
+            return self._orbital_num()
+
+    def _orbital_num(self) -> int:
+        """Number of orbitals, readers override it to avoid loading arrays."""
+        return self.dospar.shape[2]
+
+    def projected_block(
+        self,
+        ions: Sequence[int] | None = None,
+        orbitals: Sequence[int] | None = None,
+    ) -> npt.NDArray[np.floating]:
+        """Projections of some ions and orbitals.
+
+        Returns
+        -------
+        numpy.ndarray, shape (nspin, len(ions), len(orbitals), nkpoints, nbands)
+        """
+        block = self.projected
+        if ions is not None:
+            block = block[:, list(ions)]
+        if orbitals is not None:
+            block = block[:, :, list(orbitals)]
+        return block
+
+    def dospar_block(
+        self,
+        ions: Sequence[int] | None = None,
+        orbitals: Sequence[int] | None = None,
+    ) -> npt.NDArray[np.floating]:
+        """Partial DOS of some ions and orbitals.
+
+        Returns
+        -------
+        numpy.ndarray, shape (nspin, len(ions), len(orbitals), nedos)
+        """
+        block = self.dospar
+        if ions is not None:
+            block = block[:, list(ions)]
+        if orbitals is not None:
+            block = block[:, :, list(orbitals)]
+        return block
+
+    def project(
+        self, selection: "Selection", chunk: int = 32
+    ) -> npt.NDArray[np.floating]:
+        """Sum the projected band weights of (atom, orbital) pairs.
+
+        ``selection`` is the ``mask`` (ionnum, orbital_num) of ``ParsePro``, a
+        weight matrix of the same shape or a list of (atom, orbital) pairs. Ions
+        are read ``chunk`` at a time through ``projected_block`` and each chunk
+        is contracted with its (ion, orbital) weights in one ``tensordot``, so
+        memory scales with the output instead of ions x orbitals. A stack of
+        masks is contracted in the same pass, every block is read once.
+
+        Returns
+        -------
+        numpy.ndarray, shape (nspin, nkpoints, nbands)
+            or (nselection, nspin, nkpoints, nbands) for a stack of masks.
+        """
+        return self._project(self.projected_block, selection, chunk)
+
+    def project_dos(
+        self, selection: "Selection", chunk: int = 32
+    ) -> npt.NDArray[np.floating]:
+        """Sum the partial DOS of (atom, orbital) pairs, see ``project``.
+
+        Returns
+        -------
+        numpy.ndarray, shape (nspin, nedos)
+            or (nselection, nspin, nedos) for a stack of masks.
+        """
+        return self._project(self.dospar_block, selection, chunk)
+
+    @staticmethod
+    def _project(
+        read_block: Callable[..., npt.NDArray[np.floating]],
+        selection: "Selection",
+        chunk: int,
+    ) -> npt.NDArray[np.floating]:
+        if isinstance(selection, np.ndarray):
+            matrix = selection.astype(float)
+        else:
+            pairs = np.asarray(selection, dtype=int).reshape(-1, 2)
+            matrix = np.zeros(tuple(pairs.max(axis=0, initial=-1) + 1))
+            np.add.at(matrix, (pairs[:, 0], pairs[:, 1]), 1.0)
+        stacked = matrix.ndim == 3
+        matrix = matrix.reshape(-1, *matrix.shape[-2:])
+        # only read the ions and orbitals that carry weight in any selection
+        ions = np.flatnonzero(matrix.any(axis=(0, 2)))
+        orbitals = np.flatnonzero(matrix.any(axis=(0, 1)))
+        weight = matrix[:, ions][:, :, orbitals]
+
+        result: npt.NDArray[np.floating] | None = None
+        for start in range(0, len(ions), chunk):
+            block = read_block(ions[start : start + chunk], orbitals)
+            part = np.tensordot(
+                block, weight[:, start : start + chunk], axes=([1, 2], [1, 2])
+            )
+            result = part if result is None else result + part
+        if result is None:
+            raise ValueError("empty projection selection")
+        # the selections come last out of tensordot
+        result = np.moveaxis(result, -1, 0)
+        return result if stacked else result[0]
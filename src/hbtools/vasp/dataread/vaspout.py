@@ -1,20 +1,72 @@
 from .vaspdata import VaspData
 
+from collections.abc import Sequence
 from pathlib import Path
+from typing import Any
 
 import h5py  # pyright: ignore[reportMissingTypeStubs]
 import numpy as np
 import numpy.typing as npt
 
 
+def _runs(index: Sequence[int] | npt.NDArray[np.integer]) -> list[slice]:
+    """Split sorted indexes into contiguous slices."""
+    index = np.asarray(index, dtype=int)
+    if len(index) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(index) != 1) + 1
+    return [
+        slice(int(run[0]), int(run[-1]) + 1) for run in np.split(index, breaks)
+    ]
+
+
+def _hyperslab(index: Sequence[int] | npt.NDArray[np.integer]) -> slice | list[int]:
+    """A slice when ``index`` is contiguous, h5py fancy indexing otherwise."""
+    runs = _runs(index)
+    if len(runs) == 1:
+        return runs[0]
+    return [int(i) for i in index]
+
+
+def _memmap(dataset: h5py.Dataset) -> np.memmap | None:
+    """A read-only view of ``dataset`` in the file, ``None`` if it can't be mapped.
+
+    Only contiguous, uncompressed datasets have a single file offset, chunked
+    or filtered layouts have to go through h5py.
+    """
+    if dataset.chunks is not None or dataset.compression is not None:
+        return None
+    if dataset.shape is None or dataset.size == 0 or dataset.dtype.hasobject:
+        return None
+    offset = dataset.id.get_offset()
+    if offset is None:
+        return None
+    return np.memmap(
+        dataset.file.filename,
+        dtype=dataset.dtype,
+        mode="r",
+        offset=offset,
+        shape=dataset.shape,
+    )
+
+
 class ReadVaspout(VaspData):
+    """Read vaspout.h5.
+
+    With ``mmap=True`` the large arrays (eigenvalues, projections, dos) are
+    ``np.memmap`` views of the file where the dataset layout allows it, so only
+    the touched pages are read and processes share the OS page cache.
+    """
+
     def __init__(
         self,
         file: str | Path = "vaspout.h5",
         opt: bool | None = None,
         auto_select_k: bool = False,
+        mmap: bool = False,
     ):
         self.file = h5py.File(file, "r")
+        self.mmap = mmap
         if opt is True or (
             opt is None and self.file.get("input/kpoints_opt") is not None
         ):
@@ -29,6 +81,21 @@ class ReadVaspout(VaspData):
             self.k_index = np.where(self.weights >= 0)[0]
         # super().__init__()
 
+    def _dataset(self, name: str) -> h5py.Dataset | np.memmap:
+        dataset = self.file[name]
+        if self.mmap:
+            view = _memmap(dataset)
+            if view is not None:
+                return view
+        return dataset
+
+    def _read(self, name: str, *selection: slice | list[int]) -> npt.NDArray[Any]:
+        """Read ``name`` or a hyperslab of it, a memmap view in ``mmap`` mode."""
+        dataset = self._dataset(name)
+        if not selection:
+            return dataset if isinstance(dataset, np.memmap) else dataset[()]
+        return dataset[selection]
+
     # structure
 
     def _symbols(self) -> list[str]:
@@ -43,15 +110,17 @@ class ReadVaspout(VaspData):
         return int(np.array(self.file.get("results/positions/number_ion_types")).sum())
 
     def _positions(self) -> npt.NDArray[np.floating]:
-        return np.array(self.file.get("results/positions/position_ions"))
+        return self._read("results/positions/position_ions")
 
     def _real_cell(self) -> npt.NDArray[np.floating]:
         return np.array(self.file.get("results/positions/lattice_vectors"))
 
     # kpoints
     def _kpoints(self) -> npt.NDArray[np.floating]:
-        return np.array(
-            self.file.get(f"results/electron_eigenvalues{self.prefix2}/kpoint_coords")
+        return self._read(
+            f"results/electron_eigenvalues{self.prefix2}/kpoint_coords",
+            _hyperslab(self.k_index),
+            slice(None),
         )
 
     def _weights(self) -> npt.NDArray[np.floating]:
@@ -85,28 +154,98 @@ class ReadVaspout(VaspData):
         return self.eigenvalues.shape[-1]
 
     def _eigenvalues(self) -> npt.NDArray[np.floating]:
-        eigenvalues = np.array(
-            self.file.get(f"results/electron_eigenvalues{self.prefix2}/eigenvalues")
+        return self._read(
+            f"results/electron_eigenvalues{self.prefix2}/eigenvalues",
+            slice(None),
+            _hyperslab(self.k_index),
+            slice(None),
         )
-        return eigenvalues[:, self.k_index, :]
 
     def _projected(self) -> npt.NDArray[np.floating]:
-        return np.array(self.file.get(f"results/projectors{self.prefix2}/par"))[
-            :, :, :, self.k_index, :
+        return self.projected_block()
+
+    def projected_block(
+        self,
+        ions: Sequence[int] | None = None,
+        orbitals: Sequence[int] | None = None,
+    ) -> npt.NDArray[np.floating]:
+        """Read the projections of some ions and orbitals at the selected k-points.
+
+        Only hyperslabs of ``results/projectors/par`` are read: contiguous
+        ions, the span of the requested orbitals and the selected k-points,
+        so the full (spin, ion, orbital, kpoint, band) array is never built.
+
+        Returns
+        -------
+        numpy.ndarray, shape (nspin, len(ions), len(orbitals), nkpoints, nbands)
+        """
+        if "projected" in self.__dict__:
+            return super().projected_block(ions, orbitals)
+        return self._read_ions_orbitals(
+            self._dataset(f"results/projectors{self.prefix2}/par"),
+            ions,
+            orbitals,
+            _hyperslab(self.k_index),
+            slice(None),
+        )
+
+    def _orbital_num(self) -> int:
+        # from the dataset shapes, which h5py reads without the data
+        for name in (
+            f"results/projectors{self.prefix2}/par",
+            "results/electron_dos/dospar",
+        ):
+            dataset = self.file.get(name)
+            if dataset is not None:
+                return int(dataset.shape[2])
+        raise ValueError(f"no projections or partial DOS in {self.file.filename}")
+
+    def dospar_block(
+        self,
+        ions: Sequence[int] | None = None,
+        orbitals: Sequence[int] | None = None,
+    ) -> npt.NDArray[np.floating]:
+        if "dospar" in self.__dict__:
+            return super().dospar_block(ions, orbitals)
+        return self._read_ions_orbitals(
+            self._dataset("results/electron_dos/dospar"), ions, orbitals, slice(None)
+        )
+
+    @staticmethod
+    def _read_ions_orbitals(
+        dataset: h5py.Dataset | np.memmap,
+        ions: Sequence[int] | None,
+        orbitals: Sequence[int] | None,
+        *selection: slice | list[int],
+    ) -> npt.NDArray[np.floating]:
+        ions = range(dataset.shape[1]) if ions is None else ions
+        orbitals = range(dataset.shape[2]) if orbitals is None else orbitals
+        # h5py only allows a single fancy index, which is kept for the k-points
+        orbital_span = slice(min(orbitals), max(orbitals) + 1)
+        orbital_index = [i - orbital_span.start for i in orbitals]
+
+        order = np.argsort(ions, kind="stable")
+        blocks = [
+            dataset[(slice(None), run, orbital_span, *selection)][:, :, orbital_index]
+            for run in _runs(np.asarray(ions)[order])
         ]
+        result = np.concatenate(blocks, axis=1)
+        if np.any(np.diff(order) != 1):
+            result = result[:, np.argsort(order)]
+        return result
 
     # dos
     def _dos(self) -> npt.NDArray[np.floating]:
-        return np.array(self.file.get("results/electron_dos/dos"))
+        return self._read("results/electron_dos/dos")
 
     def _dose(self) -> npt.NDArray[np.floating]:
-        return np.array(self.file.get("results/electron_dos/energies"))
+        return self._read("results/electron_dos/energies")
 
     def _dosi(self) -> npt.NDArray[np.floating]:
-        return np.array(self.file.get("results/electron_dos/dosi"))
+        return self._read("results/electron_dos/dosi")
 
     def _dospar(self) -> npt.NDArray[np.floating]:
-        return np.array(self.file.get("results/electron_dos/dospar"))
+        return self._read("results/electron_dos/dospar")
 
     def _nedos(self) -> int:
         return int(np.array(self.file.get("results/electron_dos/nedos")))
@@ -1,60 +1,283 @@
-from functools import cached_property
-from typing import cast
+from pathlib import Path
+from collections.abc import Mapping, Sequence
+from typing import Any
+
+from . import cache as vasp_cache
 from .vaspdata import VaspData
 import numpy as np
-from pathlib import Path
-from lxml.etree import parse, ElementBase
+from lxml.etree import (
+    iterparse,
+    tostring,
+    _Element,
+)  # pyright: ignore[reportPrivateUsage]
 import numpy.typing as npt
 
+# only these tags are reported by iterparse, everything else is built by lxml
+# and released together with the enclosing element
+_STREAM_TAGS = (
+    "parameters",
+    "atominfo",
+    "kpoints",
+    "structure",
+    "scstep",
+    "calculation",
+    "eigenvalues",
+    "projected",
+    "dos",
+    "total",
+    "partial",
+    "set",
+    "eigenvalues_kpoints_opt",
+    "projected_kpoints_opt",
+)
+_NUMERIC_BLOCKS = ("eigenvalues", "projected", "total", "partial")
+
+
+def _text_array(elem: _Element) -> npt.NDArray[np.float64]:
+    """Decode all <r>/<v> rows below ``elem`` into a flat float array."""
+    text = tostring(elem, method="text", with_tail=False)
+    return np.fromstring(text, dtype=np.float64, sep=" ")
+
+
+def _kpoints_opt(elem: _Element) -> bool:
+    """Blocks of the KPOINTS_OPT band path of VASP >= 6.3, which repeat the
+    kpoints, eigenvalues, dos and projected tags of the main run."""
+    return str(elem.tag).endswith("_kpoints_opt") or (
+        elem.tag == "dos" and elem.get("comment") == "kpoints_opt"
+    )
+
+
+def _release(elem: _Element):
+    """Free an element and its already released siblings of the same tag."""
+    elem.clear()
+    parent = elem.getparent()
+    if parent is None:
+        return
+    while (previous := elem.getprevious()) is not None and previous.tag == elem.tag:
+        parent.remove(previous)
+
+
+class _BlockBuffer:
+    """Preallocated float64 array filled with the rows of consecutive sets."""
+
+    def __init__(
+        self,
+        name: str,
+        shape: tuple[int, ...],
+        fields: int,
+        columns: slice = slice(None),
+        transpose: tuple[int, ...] | None = None,
+    ):
+        self.name = name
+        self.data = np.empty(shape, dtype=np.float64)
+        self.rows = self.data.reshape(-1, len(range(fields)[columns]))
+        self.fields, self.columns, self.transpose = fields, columns, transpose
+        self.filled = 0
+
+    def write(self, elem: _Element):
+        values = _text_array(elem).reshape(-1, self.fields)[:, self.columns]
+        end = self.filled + len(values)
+        if end > len(self.rows):
+            raise ValueError(
+                f"{self.name} block is larger than expected {self.data.shape}"
+            )
+        self.rows[self.filled : end] = values
+        self.filled = end
+
+    def result(self) -> dict[str, npt.NDArray[np.float64]]:
+        if self.filled != len(self.rows):
+            raise ValueError(
+                f"{self.name} block is smaller than expected {self.data.shape}"
+            )
+        if self.transpose is None:
+            return {self.name: self.data}
+        return {self.name: self.data.transpose(self.transpose)}
+
 
 class ReadVasprun(VaspData):
+    """Streaming reader for vasprun.xml.
+
+    The file is parsed once with ``iterparse``. Numeric blocks are decoded set
+    by set and the XML elements are cleared immediately, so peak memory is
+    bounded by the numeric arrays instead of the whole document tree.
+
+    With ``cache=True`` the parsed arrays are kept in a ``.hbcache`` sidecar
+    next to the file and loaded from there as long as the file is unchanged.
+    The cache is off by default, ``HB_CACHE=1`` turns it on for every reader.
+    """
+
     def __init__(
-        self, file: str | Path = Path("vasprun.xml"), auto_select_k: bool = False
+        self,
+        file: str | Path = Path("vasprun.xml"),
+        auto_select_k: bool = False,
+        cache: bool | None = None,
     ):
-        self.file = parse(file)
+        self.file = Path(file)
+        if cache is None:
+            cache = vasp_cache.enabled()
+        blocks: Mapping[str, Any] | None = vasp_cache.load(self.file) if cache else None
+        if blocks is None:
+            blocks = self._stream()
+            if cache:
+                vasp_cache.save(self.file, blocks)
+        self._blocks: Mapping[str, Any] = blocks
         if auto_select_k:
             self.k_index = np.where(self.weights == 0)[0]
             if list(self.k_index) == []:
-                print("here")
                 self.k_index = np.where(self.weights > 0)[0]
         else:
             self.k_index = np.where(self.weights > 0)[0]
 
-    def _get_data_str(self, xpath: str) -> str:
-        data = cast(str | None, self.file.xpath(f"string({xpath})"))
-        if data is None:
-            raise ValueError(f"can't get data by {xpath}")
+    def _stream(self) -> dict[str, Any]:
+        blocks: dict[str, Any] = {}
+        buffer: _BlockBuffer | None = None
+        stack: list[tuple[str, _Element]] = []
+        # depth of the KPOINTS_OPT blocks being skipped
+        skip = 0
+
+        for event, elem in iterparse(
+            str(self.file), events=("start", "end"), tag=_STREAM_TAGS
+        ):
+            tag = elem.tag
+            if _kpoints_opt(elem):
+                skip += 1 if event == "start" else -1
+                if event == "end":
+                    _release(elem)
+                continue
+            if skip:
+                if event == "end" and tag == "set":
+                    _release(elem)
+                continue
+            if event == "start":
+                if tag in _NUMERIC_BLOCKS:
+                    stack.append((tag, elem))
+                    buffer = None
+                continue
+
+            if tag == "set":
+                if not stack:
+                    continue
+                block, block_elem = stack[-1]
+                nested = len(stack) > 1
+                comment = elem.get("comment", "")
+                if block == "projected":
+                    if comment.startswith("band"):
+                        # decoded together with the enclosing kpoint
+                        continue
+                    decode = comment.startswith("kpoint")
+                else:
+                    decode = not nested and len(elem) > 0 and elem[0].tag == "r"
+                if decode:
+                    if buffer is None:
+                        buffer = self._new_buffer(blocks, block, block_elem)
+                    buffer.write(elem)
+                _release(elem)
+                continue
+
+            if tag in _NUMERIC_BLOCKS:
+                stack.pop()
+                if buffer is not None and not stack:
+                    blocks.update(buffer.result())
+                buffer = None
+            elif tag == "parameters":
+                blocks["nbands"] = int(
+                    _findtext(elem, "separator[@name='electronic']/i[@name='NBANDS']")
+                )
+                blocks["nedos"] = int(
+                    _findtext(elem, "separator[@name='dos']/i[@name='NEDOS']")
+                )
+                spin = (
+                    "separator[@name='electronic']/separator[@name='electronic spin']"
+                )
+                blocks["ispin"] = int(_findtext(elem, f"{spin}/i[@name='ISPIN']"))
+                noncollinear = elem.find(f"{spin}/i[@name='LNONCOLLINEAR']")
+                blocks["noncollinear"] = (
+                    noncollinear is not None and str(noncollinear.text).strip() == "T"
+                )
+            elif tag == "atominfo":
+                blocks["ionnum"] = int(_findtext(elem, "atoms"))
+                blocks["symbols"] = [
+                    str(rc[0].text).strip()
+                    for rc in elem.iterfind("array[@name='atoms']/set/rc")
+                ]
+            elif tag == "kpoints" and _is_top_level(elem):
+                blocks["kpoints"] = _text_array(
+                    _find(elem, "varray[@name='kpointlist']")
+                ).reshape(-1, 3)
+                blocks["weights"] = _text_array(_find(elem, "varray[@name='weights']"))
+            elif tag == "structure" and elem.get("name") == "finalpos":
+                blocks["positions"] = _text_array(
+                    _find(elem, "varray[@name='positions']")
+                ).reshape(-1, 3)
+                blocks["real_cell"] = _text_array(
+                    _find(elem, "crystal/varray[@name='basis']")
+                ).reshape(3, 3)
+            elif tag == "dos":
+                blocks["fermi"] = float(_findtext(elem, "i"))
+            _release(elem)
+
+        return blocks
+
+    def _new_buffer(
+        self, blocks: dict[str, Any], tag: str, elem: _Element
+    ) -> "_BlockBuffer":
+        """Allocate the full array of a numeric block before decoding it.
+
+        The shape follows from NBANDS, NEDOS, ISPIN, the number of ions and
+        k-points that precede the block in vasprun.xml.
+        """
+        fields = len(elem.findall("array/field"))
+        nspin = blocks["ispin"]
+        # projections of noncollinear runs carry total, mx, my and mz
+        nspin_pro = 4 if blocks["noncollinear"] else nspin
+        nkpoints, nbands = len(blocks["kpoints"]), blocks["nbands"]
+        ionnum, nedos = blocks["ionnum"], blocks["nedos"]
+        if tag == "eigenvalues":
+            # keep eigenvalues only, occupations are dropped while decoding
+            return _BlockBuffer(
+                "eigenvalues", (nspin, nkpoints, nbands), fields, slice(0, 1)
+            )
+        elif tag == "projected":
+            return _BlockBuffer(
+                "projected",
+                (nspin_pro, nkpoints, nbands, ionnum, fields),
+                fields,
+                transpose=(0, 3, 4, 1, 2),
+            )
+        elif tag == "total":
+            return _BlockBuffer("tdos", (nspin, nedos, fields), fields)
         else:
-            return data
+            return _BlockBuffer(
+                "dospar",
+                (ionnum, nspin_pro, nedos, fields - 1),
+                fields,
+                slice(1, None),
+                transpose=(1, 0, 3, 2),
+            )
+
+    def _block(self, name: str) -> Any:
+        if name not in self._blocks:
+            raise ValueError(f"can't get {name} from {self.file}")
+        return self._blocks[name]
 
     def _symbols(self) -> list[str]:
-        symbolstr = self._get_data_str("/modeling/atominfo/array[@name='atoms']/set[1]")
-        return symbolstr.split()[0:-1:2]
+        return [str(i) for i in self._block("symbols")]
 
     def _ionnum(self) -> int:
-        return int(self._get_data_str("/modeling/atominfo/atoms"))
+        return int(self._block("ionnum"))
 
     def _positions(self) -> npt.NDArray[np.floating]:
-        position_str = self._get_data_str(
-            "/modeling/structure[@name='finalpos']/varray[@name='positions']"
-        )
-        return np.array(position_str.split(), dtype=float).reshape(-1, 3)
+        return self._block("positions")
 
     def _real_cell(self) -> npt.NDArray[np.floating]:
-        basis_str = self._get_data_str(
-            "/modeling/structure[@name='finalpos']/crystal/varray[@name='basis']"
-        )
-        return np.array(basis_str.split(), dtype=float).reshape(3, 3)
+        return self._block("real_cell")
 
     # kpoints
     def _kpoints(self) -> npt.NDArray[np.floating]:
-        kpoints_str = self._get_data_str("/modeling/kpoints/varray[@name='kpointlist']")
-        kpointsarray = np.array(kpoints_str.split(), dtype=float).reshape(-1, 3)
-        return kpointsarray[self.k_index]
+        return self._block("kpoints")[self.k_index]
 
     def _weights(self) -> npt.NDArray[np.floating]:
-        weights_str = self._get_data_str("/modeling/kpoints/varray[@name='weights']")
-        return np.array(weights_str.split(), dtype=float)
+        return self._block("weights")
 
     def _labels_kpoints(self) -> list[str] | None:
         return None
@@ -63,42 +286,37 @@ class ReadVasprun(VaspData):
         return None
 
     def _fermi(self) -> float:
-        return float(self._get_data_str("/modeling/calculation/dos/i"))
+        return float(self._block("fermi"))
 
     def _nbands(self) -> int:
-        return int(
-            self._get_data_str(
-                "/modeling/parameters/separator[@name='electronic']/i[@name='NBANDS']"
-            )
-        )
+        return int(self._block("nbands"))
 
     def _eigenvalues(self) -> npt.NDArray[np.floating]:
-        eigen_str = self._get_data_str("/modeling/calculation/eigenvalues/array/set")
-        eigenarray = np.array(eigen_str.split(), dtype=float).reshape(
-            -1, len(self.kpoints), self.nbands, 2
-        )[:, :, :, 0]
-        return eigenarray[:, self.k_index, :]
+        return self._block("eigenvalues")[:, self.k_index, :]
 
     def _projected(self) -> npt.NDArray[np.floating]:
-        project_str = self._get_data_str("/modeling/calculation/projected/array/set")
-        orbitals = cast(
-            list[ElementBase], self.file.xpath("/modeling/calculation/projected/array")
-        )
-        orbital_num = len(orbitals)
-        projectarray = (
-            np.fromstring(project_str, dtype=np.float64, sep=" ")
-            .reshape(-1, len(self.kpoints), self.nbands, self.ionnum, orbital_num)
-            .transpose([0, 3, 4, 1, 2])
-        )
-        return projectarray[:, :, :, self.k_index, :]
+        return self._block("projected")[:, :, :, self.k_index, :]
+
+    def projected_block(
+        self,
+        ions: Sequence[int] | None = None,
+        orbitals: Sequence[int] | None = None,
+    ) -> npt.NDArray[np.floating]:
+        if "projected" in self.__dict__:
+            return super().projected_block(ions, orbitals)
+        # select ions and orbitals before k-points to copy as little as possible
+        block = self._block("projected")
+        if ions is not None:
+            block = block[:, list(ions)]
+        if orbitals is not None:
+            block = block[:, :, list(orbitals)]
+        return block[:, :, :, self.k_index, :]
 
     # dos
 
-    @cached_property
+    @property
     def _tdos(self) -> npt.NDArray[np.floating]:
-        dos_str = self._get_data_str("/modeling/calculation/dos/total/array/set")
-        dosarray = np.array(dos_str.split(), dtype=float).reshape(-1, self.nedos, 3)
-        return dosarray
+        return self._block("tdos")
 
     def _dose(self) -> npt.NDArray[np.floating]:
         return self._tdos[:, :, 0]
@@ -110,20 +328,33 @@ class ReadVasprun(VaspData):
         return self._tdos[:, :, 2]
 
     def _dospar(self) -> npt.NDArray[np.floating]:
-        orbitals = cast(
-            list[ElementBase],
-            self.file.xpath("/modeling/calculation/dos/partial/array/field"),
-        )
-        orbital_num = len(orbitals)
-        dos_str = self._get_data_str("/modeling/calculation/dos/partial/array/set")
-        dosarray = np.array(dos_str.split(), dtype=float).reshape(
-            self.ionnum, -1, self.nedos, orbital_num
-        )
-        return dosarray[:, :, :, 1:].transpose(1, 0, 3, 2)
+        return self._block("dospar")
+
+    def _orbital_num(self) -> int:
+        for name in ("projected", "dospar"):
+            if isinstance(self._blocks, vasp_cache.LazyNpz) and name in self._blocks:
+                # from the npy header, the cached block itself is not loaded
+                return self._blocks.shape(name)[2]
+            elif name in self._blocks:
+                return self._blocks[name].shape[2]
+        raise ValueError(f"no projections or partial DOS in {self.file}")
 
     def _nedos(self) -> int:
-        return int(
-            self._get_data_str(
-                "/modeling/parameters/separator[@name='dos']/i[@name='NEDOS']"
-            )
-        )
+        return int(self._block("nedos"))
+
+
+def _is_top_level(elem: _Element) -> bool:
+    """Whether ``elem`` is a direct child of <modeling>."""
+    parent = elem.getparent()
+    return parent is not None and parent.getparent() is None
+
+
+def _find(elem: _Element, path: str) -> _Element:
+    result = elem.find(path)
+    if result is None:
+        raise ValueError(f"can't get data by {path}")
+    return result
+
+
+def _findtext(elem: _Element, path: str) -> str:
+    return str(_find(elem, path).text)
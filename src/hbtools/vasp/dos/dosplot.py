@@ -1,4 +1,5 @@
 import sys
+import weakref
 from functools import cached_property
 from typing import Any
 
@@ -11,9 +12,19 @@ from matplotlib.patches import Polygon
 from hbtools.utils.plot_utils import AxesSet
 from .. import vasp_utils
 from ...utils import plot_utils
-from ..dataread import ReadVaspout, ReadVasprun, VaspData
+from ..dataread import VaspData, readers
+from . import engine
 from .params import DosParams
 
+# histograms of every reader, so broadening the same data again is only an FFT
+_histograms: weakref.WeakKeyDictionary[
+    VaspData, dict[tuple[Any, ...], engine.DosHistogram]
+] = weakref.WeakKeyDictionary()
+# projected DOS of every reader by selection string and DOS settings
+_projected: weakref.WeakKeyDictionary[VaspData, dict[tuple[Any, ...], np.ndarray]] = (
+    weakref.WeakKeyDictionary()
+)
+
 
 def fillplot(x: np.ndarray, y: np.ndarray, ax: axes.Axes | None = None, **kwargs: Any):
     if ax is None:
@@ -103,46 +114,129 @@ class DosPlot(plot_utils.FigPlotBase):
         if self.params.legend:
             self.ax.legend(loc="best")
 
+    @classmethod
+    def prefetch(cls, params: plot_utils.FigSetBase, files: list[str], cache_size: int):
+        assert isinstance(params, DosParams)
+        readers.resize(max(readers.maxsize, cache_size))
+        readers.prefetch(files, params.vaspfileformat, warm=("dose", "dos", "fermi"))
+
     @cached_property
     def data(self) -> VaspData:
-        if self.params.vaspfileformat == "h5":
-            data = ReadVaspout(self.params.file)
-        else:
-            data = ReadVasprun(self.params.file)
-        return data
+        return readers.open(self.params.file, self.params.vaspfileformat)
 
     @cached_property
-    def xlist(self) -> np.ndarray:
+    def efermi(self) -> float:
         if self.params.efermi is None:
-            return self.data.dose - self.data.fermi
-        else:
-            return self.data.dose - self.params.efermi
+            return self.data.fermi
+        return self.params.efermi
 
     @cached_property
-    def total_dos(self) -> np.ndarray:
-        return self.data.dos
+    def energies(self) -> np.ndarray:
+        """Grid of the computed DOS, in absolute energies."""
+        eigenvalues = self.data.eigenvalues
+        if self.params.xrange is None:
+            return engine.dos_grid(eigenvalues, self.params.nedos)
+        emin, emax = np.add(self.params.xrange, self.efermi)
+        return engine.dos_grid(eigenvalues, self.params.nedos, emin, emax)
 
     @cached_property
-    def pdos_list(self):
-        result: list[np.ndarray] = []
-        assert self.params.pro_atoms_orbitals is not None
+    def degeneracy(self) -> float:
+        """Electrons per state, 2 unless spin polarized or noncollinear."""
+        if len(self.data.eigenvalues) == 2:
+            return 1.0
+        try:
+            nspin_pro = len(self.data.projected_block([0], [0]))
+        except Exception:
+            # no projections written, assume a collinear run
+            nspin_pro = 1
+        return 1.0 if nspin_pro == 4 else 2.0
+
+    @cached_property
+    def grid(self) -> tuple[float, float, int] | None:
+        """Identifies the energy grid, ``None`` for the grid written by vasp."""
+        if self.params.method == "vasp":
+            return None
+        return (self.energies[0], self.energies[-1], len(self.energies))
 
-        for i, atom_orbital_str in enumerate(self.params.pro_atoms_orbitals):
-            result.append(
-                np.sum(
-                    [
-                        self.data.dospar[:, atom, orbital, :]
-                        for atom, orbital in vasp_utils.ParsePro(
-                            self.data,
-                            atom_orbital_str,
-                            self.params.colors.split()[i],
-                            i,
-                        ).result
-                    ],
-                    axis=0,
+    def histogram(self, mask: np.ndarray | None = None) -> engine.DosHistogram:
+        """Histogram of the total or ``mask`` projected states, kept per reader.
+
+        ``mask`` is one (ionnum, orbital_num) selection or a stack of them.
+        """
+        selection = None if mask is None else (mask.shape, mask.tobytes())
+        histograms = _histograms.setdefault(self.data, {})
+        key = (self.grid, selection)
+        if key not in histograms:
+            if self.grid is None:
+                dos = self.data.dos if mask is None else self.data.project_dos(mask)
+                histograms[key] = engine.DosHistogram.from_dos(self.data.dose, dos)
+            else:
+                histograms[key] = engine.DosHistogram.from_eigenvalues(
+                    self.data.eigenvalues,
+                    self.data.weights,
+                    self.energies,
+                    None if mask is None else self.data.project(mask),
+                    self.degeneracy,
+                    self.params.threads or None,
                 )
+        return histograms[key]
+
+    def compute_dos(self, mask: np.ndarray | None = None) -> np.ndarray:
+        method, sigma = self.params.method, self.params.sigma
+        if method == "tetrahedron":
+            return engine.tetrahedron_dos(
+                self.data.eigenvalues,
+                self.data.kpoints,
+                self.energies,
+                None if mask is None else self.data.project(mask),
+                self.degeneracy,
+                self.params.threads or None,
             )
-        return result
+        if method == "vasp":
+            if sigma is None:
+                return self.data.dos if mask is None else self.data.project_dos(mask)
+            return self.histogram(mask).dos(sigma)
+        return self.histogram(mask).dos(0.05 if sigma is None else sigma, method)
+
+    @cached_property
+    def xlist(self) -> np.ndarray:
+        if self.params.method != "vasp":
+            return self.energies - self.efermi
+        return self.data.dose - self.efermi
+
+    @cached_property
+    def total_dos(self) -> np.ndarray:
+        return self.compute_dos()
+
+    @cached_property
+    def pdos_list(self) -> list[np.ndarray]:
+        """DOS of every selection, the new ones computed together in one pass.
+
+        Results are kept per reader and selection string, so replotting with
+        other labels or colors doesn't project again.
+        """
+        assert self.params.pro_atoms_orbitals is not None
+        selections = self.params.pro_atoms_orbitals
+        masks = np.stack(
+            [
+                vasp_utils.ParsePro(
+                    self.data,
+                    atom_orbital_str,
+                    self.params.colors.split()[i],
+                    i,
+                ).mask
+                for i, atom_orbital_str in enumerate(selections)
+            ]
+        )
+        settings = (self.params.method, self.params.sigma, self.grid)
+        computed = _projected.setdefault(self.data, {})
+        missing = [
+            i for i, key in enumerate(selections) if (key, *settings) not in computed
+        ]
+        if missing:
+            for i, pdos in zip(missing, self.compute_dos(masks[missing])):
+                computed[(selections[i], *settings)] = pdos
+        return [computed[(s, *settings)] for s in selections]
 
     def _plotdos(self, dos: np.ndarray, **kwargs: Any):
         if self.params.pmode == 1:
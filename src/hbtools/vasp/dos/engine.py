@@ -0,0 +1,366 @@
+"""DOS computed from eigenvalues instead of the DOS written by vasp.
+
+``smearing_dos`` bins the weighted eigenvalues on a fine energy grid and
+convolves the histogram with a Gaussian or Lorentzian. ``DosHistogram`` keeps
+that histogram, so sweeping the width only repeats the FFT convolution.
+``tetrahedron_dos`` uses the linear tetrahedron method on a full k-grid. Both
+work on chunks of k-points in a thread pool, so memory stays bounded for dense
+grids.
+"""
+
+import os
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import numpy.typing as npt
+
+# elements of the largest temporary array, shared by the chunks of all threads
+CHUNK_SIZE = 1 << 22
+# default number of threads, more only add memory for these numpy kernels
+MAX_THREADS = 4
+# how far the histogram reaches beyond the energy window, in eV
+_TAIL = 20.0
+
+
+def _chunks(n: int, size: int) -> Iterator[slice]:
+    size = max(int(size), 1)
+    return (slice(start, min(start + size, n)) for start in range(0, n, size))
+
+
+def _threads(workers: int | None) -> int:
+    """``workers`` threads, by default one per cpu up to ``MAX_THREADS``."""
+    return workers or min(os.cpu_count() or 1, MAX_THREADS)
+
+
+def _reduce(
+    func: Callable[[slice], npt.NDArray[np.floating]],
+    n: int,
+    size: int,
+    workers: int,
+) -> npt.NDArray[np.floating]:
+    """Sum ``func`` over chunks of ``range(n)``, in threads unless workers == 1.
+
+    ``size`` is the chunk of all threads together, each thread gets its share.
+    """
+    chunks = list(_chunks(n, size // workers))
+    if workers == 1 or len(chunks) == 1:
+        return sum(map(func, chunks))  # type: ignore
+    with ThreadPoolExecutor(workers) as executor:
+        return sum(executor.map(func, chunks))  # type: ignore
+
+
+def _spin_projections(
+    eigenvalues: npt.NDArray[np.floating],
+    projections: npt.NDArray[np.floating] | None,
+) -> tuple[npt.NDArray[np.integer], npt.NDArray[np.floating] | None, tuple[int, ...]]:
+    """Which eigenvalue spin belongs to every output channel.
+
+    Projections of shape (..., nchannel, nkpoints, nbands) are flattened to
+    channels. Noncollinear projections (total, mx, my, mz) all use the only
+    spin.
+
+    Returns
+    -------
+    numpy.ndarray
+        Spin of every flattened channel.
+    numpy.ndarray or None
+        shape (nchannels, nkpoints, nbands)
+    tuple
+        Shape of the channels in the output.
+    """
+    if projections is None:
+        return np.arange(len(eigenvalues)), None, (len(eigenvalues),)
+    shape = projections.shape[:-2]
+    spins = np.minimum(np.arange(shape[-1]), len(eigenvalues) - 1)
+    spins = np.tile(spins, int(np.prod(shape[:-1])))
+    return spins, projections.reshape(-1, *projections.shape[-2:]), shape
+
+
+def dos_grid(
+    eigenvalues: npt.NDArray[np.floating],
+    nedos: int = 2001,
+    emin: float | None = None,
+    emax: float | None = None,
+    margin: float = 1.0,
+) -> npt.NDArray[np.floating]:
+    """A uniform energy grid, by default all eigenvalues plus ``margin`` eV."""
+    emin = float(eigenvalues.min()) - margin if emin is None else emin
+    emax = float(eigenvalues.max()) + margin if emax is None else emax
+    return np.linspace(emin, emax, nedos)
+
+
+def histogram(
+    eigenvalues: npt.NDArray[np.floating],
+    weights: npt.NDArray[np.floating],
+    energies: npt.NDArray[np.floating],
+    projections: npt.NDArray[np.floating] | None = None,
+    workers: int | None = None,
+) -> tuple[npt.NDArray[np.floating], int]:
+    """Weighted eigenvalues binned on ``energies`` extended by a tail.
+
+    Each state is shared linearly between its two nearest grid points.
+
+    Returns
+    -------
+    numpy.ndarray, shape (..., nchannel, len(energies) + 2 * pad)
+    int
+        ``pad``, the number of extra grid points on each side.
+    """
+    de = energies[1] - energies[0]
+    reach = max(energies[0] - eigenvalues.min(), eigenvalues.max() - energies[-1], 0)
+    pad = int(np.ceil(min(reach, _TAIL) / de))
+    start, size = energies[0] - pad * de, len(energies) + 2 * pad
+    weights = np.asarray(weights) / np.sum(weights)
+    spins, projections, shape = _spin_projections(eigenvalues, projections)
+    nchannel, nkpoints, nbands = len(spins), *eigenvalues.shape[1:]
+    # channels are binned together on consecutive copies of the grid
+    offset = np.arange(nchannel)[:, None, None] * size
+
+    def chunk(ks: slice) -> npt.NDArray[np.floating]:
+        position = (eigenvalues[spins, ks, :] - start) / de
+        state = weights[None, ks, None]
+        if projections is not None:
+            state = state * projections[:, ks, :]
+        state = np.broadcast_to(state, position.shape)
+        lower = np.floor(position).astype(int)
+        upper = position - lower
+
+        result = np.zeros(nchannel * size)
+        for index, share in ((lower, 1 - upper), (lower + 1, upper)):
+            keep = (index >= 0) & (index < size)
+            result += np.bincount(
+                (index + offset)[keep], (state * share)[keep], minlength=len(result)
+            )
+        return result.reshape(nchannel, size)
+
+    size = CHUNK_SIZE // (nchannel * nbands)
+    hist = _reduce(chunk, nkpoints, size, _threads(workers))
+    return hist.reshape(*shape, size), pad
+
+
+def _kernel(n: int, de: float, width: float, kind: str) -> npt.NDArray[np.floating]:
+    """Broadening kernel on ``n`` grid offsets in FFT order (0, 1, ..., -1)."""
+    offset: npt.NDArray[np.integer] = np.arange(n)
+    offset = np.where(offset < n - n // 2, offset, offset - n)
+    kernel: npt.NDArray[np.floating] = np.zeros(n)
+    if width <= 0:
+        kernel[0] = 1.0
+    elif kind == "gaussian":
+        reach = int(np.ceil(5 * width / de))
+        x = offset[np.abs(offset) <= reach] * de
+        kernel[np.abs(offset) <= reach] = np.exp(-(x**2) / (2 * width**2))
+        # normalized on the untruncated lattice, also for widths below de
+        x = np.arange(-reach, reach + 1) * de
+        kernel /= np.exp(-(x**2) / (2 * width**2)).sum()
+    elif kind == "lorentzian":
+        x = offset * de
+        kernel = width / np.pi / (x**2 + width**2) * de
+    else:
+        raise ValueError(f"unknown smearing {kind}")
+    return kernel
+
+
+class DosHistogram:
+    """States binned on a fine grid, broadened to any width by FFT convolution.
+
+    The spectrum of the histogram is computed once, every new width costs one
+    transform of its kernel and one inverse transform, and widths already
+    asked for are kept.
+
+    Parameters
+    ----------
+    hist
+        shape (..., size), states per grid point.
+    de
+        Grid spacing.
+    pad
+        Grid points on each side that only feed the tails into the window.
+    degeneracy
+        Electrons per state.
+    """
+
+    def __init__(
+        self,
+        hist: npt.NDArray[np.floating],
+        de: float,
+        pad: int = 0,
+        degeneracy: float = 1.0,
+    ):
+        self.hist, self.de, self.pad, self.degeneracy = hist, de, pad, degeneracy
+        # twice the grid, so the circular convolution never wraps around
+        self._n = 2 * hist.shape[-1]
+        self._spectrum = np.fft.rfft(hist, self._n)
+        self._broadened: dict[tuple[float, str], npt.NDArray[np.floating]] = {}
+
+    @classmethod
+    def from_eigenvalues(
+        cls,
+        eigenvalues: npt.NDArray[np.floating],
+        weights: npt.NDArray[np.floating],
+        energies: npt.NDArray[np.floating],
+        projections: npt.NDArray[np.floating] | None = None,
+        degeneracy: float = 1.0,
+        workers: int | None = None,
+    ) -> "DosHistogram":
+        hist, pad = histogram(eigenvalues, weights, energies, projections, workers)
+        return cls(hist, energies[1] - energies[0], pad, degeneracy)
+
+    @classmethod
+    def from_dos(
+        cls, energies: npt.NDArray[np.floating], dos: npt.NDArray[np.floating]
+    ) -> "DosHistogram":
+        """A DOS on a uniform grid, e.g. ``dos`` or ``dospar`` written by vasp."""
+        de = float(np.diff(energies, axis=-1).flat[0])
+        return cls(np.asarray(dos) * de, de)
+
+    def dos(self, width: float, kind: str = "gaussian") -> npt.NDArray[np.floating]:
+        """DOS broadened by ``width`` eV, on the grid without the padding.
+
+        Returns
+        -------
+        numpy.ndarray, shape (..., size - 2 * pad)
+        """
+        key = (width, kind)
+        if key not in self._broadened:
+            spectrum = self._spectrum * np.fft.rfft(
+                _kernel(self._n, self.de, width, kind)
+            )
+            size = self.hist.shape[-1]
+            dos = np.fft.irfft(spectrum, self._n)[..., self.pad : size - self.pad]
+            self._broadened[key] = dos * self.degeneracy / self.de
+        return self._broadened[key]
+
+
+def _grid_index(kpoints: npt.NDArray[np.floating]) -> npt.NDArray[np.integer]:
+    """Place the k-points of a full Monkhorst-Pack grid on an (n1, n2, n3) array."""
+    frac = np.asarray(kpoints) % 1.0
+    n = np.array(
+        [len(np.unique(np.round(frac[:, i], 6) % 1.0)) for i in range(3)], dtype=int
+    )
+    shift = (frac[0] * n) % 1.0
+    index = np.rint(frac * n - shift).astype(int) % n
+    grid = np.full(n, -1, dtype=int)
+    grid[index[:, 0], index[:, 1], index[:, 2]] = np.arange(len(frac))
+    if len(frac) != n.prod() or (grid < 0).any():
+        raise ValueError(
+            "the tetrahedron method needs all k-points of the grid, use ISYM = -1"
+        )
+    return grid
+
+
+def tetrahedra(kpoints: npt.NDArray[np.floating]) -> npt.NDArray[np.integer]:
+    """Split every cell of the k-grid into 6 tetrahedra along its 0-7 diagonal.
+
+    Returns
+    -------
+    numpy.ndarray, shape (6 * nkpoints, 4)
+        k-point indexes of the corners.
+    """
+    grid = _grid_index(kpoints)
+    n = np.array(grid.shape)
+    cells = np.indices(grid.shape).reshape(3, -1).T
+    # corner i of a cell is at (i & 1, i >> 1 & 1, i >> 2 & 1)
+    offsets = np.array([[i & 1, i >> 1 & 1, i >> 2 & 1] for i in range(8)])
+    corners = (cells[:, None, :] + offsets[None, :, :]) % n
+    corner_k = grid[corners[..., 0], corners[..., 1], corners[..., 2]]
+    paths = np.array(
+        [
+            [0, 1, 3, 7],
+            [0, 1, 5, 7],
+            [0, 2, 3, 7],
+            [0, 2, 6, 7],
+            [0, 4, 5, 7],
+            [0, 4, 6, 7],
+        ]
+    )
+    return corner_k[:, paths].reshape(-1, 4)
+
+
+def _tetrahedron_weights(
+    e: npt.NDArray[np.floating], x: npt.NDArray[np.floating]
+) -> npt.NDArray[np.floating]:
+    """DOS at ``x`` of linear tetrahedra with sorted corner energies ``e``
+    (len(x), 4).
+
+    Each tetrahedron integrates to 1 (Blöchl et al., PRB 49, 16223).
+    """
+    tiny = 1e-12
+    e1, e2, e3, e4 = (e[:, i] for i in range(4))
+    d21, d31, d41 = (np.maximum(d, tiny) for d in (e2 - e1, e3 - e1, e4 - e1))
+    d32, d42, d43 = (np.maximum(d, tiny) for d in (e3 - e2, e4 - e2, e4 - e3))
+    g1 = 3 * (x - e1) ** 2 / (d21 * d31 * d41)
+    g2 = (3 * d21 + 6 * (x - e2) - 3 * (d31 + d42) * (x - e2) ** 2 / (d32 * d42)) / (
+        d31 * d41
+    )
+    g3 = 3 * (e4 - x) ** 2 / (d41 * d42 * d43)
+    return np.where(x < e2, g1, np.where(x < e3, g2, g3))
+
+
+def _tetrahedron_sum(
+    e: npt.NDArray[np.floating],
+    weight: npt.NDArray[np.floating] | None,
+    energies: npt.NDArray[np.floating],
+    size: int,
+) -> npt.NDArray[np.floating]:
+    """Weighted DOS of tetrahedra with sorted corner energies ``e`` (n, 4).
+
+    Only the grid points in [e1, e4) of every tetrahedron are evaluated, at
+    most about ``size`` of them at once.
+    """
+    start = np.searchsorted(energies, e[:, 0])
+    counts = np.searchsorted(energies, e[:, 3]) - start
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if len(ends) else 0
+    # groups of whole tetrahedra
+    cuts = np.unique(np.searchsorted(ends, np.arange(size, total, size)))
+    result = np.zeros(len(energies))
+    for group in np.split(np.arange(len(e)), cuts):
+        n = counts[group]
+        entry = np.repeat(group, n)
+        point = start[entry] + np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        g = _tetrahedron_weights(e[entry], energies[point])
+        if weight is not None:
+            g *= weight[entry]
+        result += np.bincount(point, g, minlength=len(energies))
+    return result
+
+
+def tetrahedron_dos(
+    eigenvalues: npt.NDArray[np.floating],
+    kpoints: npt.NDArray[np.floating],
+    energies: npt.NDArray[np.floating],
+    projections: npt.NDArray[np.floating] | None = None,
+    degeneracy: float = 1.0,
+    workers: int | None = None,
+) -> npt.NDArray[np.floating]:
+    """Linear tetrahedron DOS, the k-points must be a full grid.
+
+    The projection of a state in a tetrahedron is the mean over its corners.
+
+    Returns
+    -------
+    numpy.ndarray, shape (..., nchannel, len(energies))
+    """
+    corners = tetrahedra(kpoints)
+    spins, projections, shape = _spin_projections(eigenvalues, projections)
+    nspin, nbands = len(spins), eigenvalues.shape[2]
+    workers = _threads(workers)
+    # the weights of a point take about 16 temporary arrays
+    points = CHUNK_SIZE // (16 * workers)
+
+    def chunk(ts: slice) -> npt.NDArray[np.floating]:
+        result = np.zeros((nspin, len(energies)))
+        for i, spin in enumerate(spins):
+            # shape (ntetra * nbands, 4)
+            e = eigenvalues[spin][corners[ts]].transpose(0, 2, 1).reshape(-1, 4)
+            weight = None
+            if projections is not None:
+                weight = projections[i][corners[ts]].mean(axis=1).reshape(-1)
+            result[i] = _tetrahedron_sum(np.sort(e, axis=-1), weight, energies, points)
+        return result
+
+    # a few arrays of 4 corners for every (tetrahedron, band)
+    size = CHUNK_SIZE // (16 * nbands)
+    dos = _reduce(chunk, len(corners), size, workers)
+    return dos.reshape(*shape, len(energies)) * degeneracy / len(corners)
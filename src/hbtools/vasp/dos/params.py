@@ -50,6 +50,46 @@ class DosParams(FigSetBase):
         ),
     ] = None
 
+    method: Annotated[
+        str,
+        typer.Option(
+            "--method",
+            "-m",
+            click_type=click.Choice(["vasp", "gaussian", "lorentzian", "tetrahedron"]),
+            help="DOS written by vasp, or computed from the eigenvalues with "
+            "gaussian or lorentzian smearing or the tetrahedron method (ISYM = -1)",
+            rich_help_panel="DOS engine",
+        ),
+    ] = "vasp"
+    sigma: Annotated[
+        float | None,
+        typer.Option(
+            "--sigma",
+            min=0,
+            help="smearing width in eV, 0.05 by default; with --method vasp the "
+            "DOS written by vasp is broadened further",
+            rich_help_panel="DOS engine",
+        ),
+    ] = None
+    nedos: Annotated[
+        int,
+        typer.Option(
+            "--nedos",
+            min=2,
+            help="energy grid points, over --xrange if given",
+            rich_help_panel="DOS engine",
+        ),
+    ] = 2001
+    threads: Annotated[
+        int,
+        typer.Option(
+            "--threads",
+            min=0,
+            help="threads over k-point chunks, 0 for one per cpu up to 4",
+            rich_help_panel="DOS engine",
+        ),
+    ] = 0
+
     xlabel: Annotated[
         str | None,
         typer.Option(
@@ -1,5 +1,6 @@
 import itertools
 import sys
+from dataclasses import dataclass
 
 import numpy as np
 import numpy.typing as npt
@@ -10,75 +11,120 @@ from rich.panel import Panel
 from .dataread import VaspData
 
 
-def get_gap(
+@dataclass
+class BandEdges:
+    """Band edges of one spin channel, energies are absolute (eV).
+
+    ``nvalence`` is the number of bands below the Fermi level, the VBM lies in
+    band ``nvalence`` and the CBM in band ``nvalence + 1`` (1-based). For a
+    metal ``gap`` is 0 and the edge fields are ``None``.
+    """
+
+    spin: int
+    nvalence: int
+    metal: bool
+    gap: float
+    vbm: float | None = None
+    cbm: float | None = None
+    k_vbm: npt.NDArray[np.floating] | None = None
+    k_cbm: npt.NDArray[np.floating] | None = None
+    direct_gap: float | None = None
+    k_direct: npt.NDArray[np.floating] | None = None
+
+    @property
+    def direct(self) -> bool:
+        return (
+            not self.metal
+            and self.direct_gap is not None
+            and bool(np.isclose(self.direct_gap, self.gap))
+        )
+
+
+def band_edges(
     eigenvalues: npt.NDArray[np.floating],
     fermi: float,
     kpoints: np.ndarray,
-    stdout: bool = False,
     vbms: list[int] | None = None,
-) -> list[float]:
-    def is_metal_or_vbm(ylist: np.ndarray) -> bool | int:
-        nbands = ylist.shape[1]
-        extremum = np.array(
-            [[ylist[:, n].min(), ylist[:, n].max()] for n in range(nbands)]
-        )
+) -> list[BandEdges]:
+    """Find VBM, CBM, indirect and direct gaps of every spin at once.
 
-        if (extremum[:, 0] * extremum[:, 1]).min() > 0:
-            maxs = extremum[:, 1]
-            vbm = int(np.count_nonzero(abs(maxs) - maxs))
-            return vbm
-        else:
-            return True
+    ``vbms`` overrides the number of valence bands of each spin, otherwise a
+    spin with a band crossing the Fermi level is a metal.
+    """
+    ylist = np.asarray(eigenvalues) - fermi
+    nspin, _, nbands = ylist.shape
+    band_min = ylist.min(axis=1)
+    band_max = ylist.max(axis=1)
 
-    def get_kpoints_vbm(ylist: np.ndarray, kpoints: np.ndarray):
-        index = np.where(ylist == ylist.max())
-        return kpoints[index]
+    if vbms is None:
+        nvalence = np.count_nonzero(band_max < 0, axis=1)
+        crossing = (band_min * band_max).min(axis=1) <= 0
+    else:
+        nvalence = np.asarray(vbms[:nspin], dtype=int)
+        crossing = np.zeros(nspin, dtype=bool)
+    gapped = ~crossing & (nvalence > 0) & (nvalence < nbands)
 
-    def get_kpoints_cbm(ylist: np.ndarray, kpoints: np.ndarray):
-        index = np.where(ylist == ylist.min())
-        return kpoints[index]
+    # valence and conduction band of every spin, shape (nspin, nkpoints)
+    ivb = np.clip(nvalence, 1, max(nbands - 1, 1)) - 1
+    valence = np.take_along_axis(ylist, ivb[:, None, None], axis=2)[:, :, 0]
+    conduction = np.take_along_axis(
+        ylist, np.minimum(ivb + 1, nbands - 1)[:, None, None], axis=2
+    )[:, :, 0]
+    e_vbm = valence.max(axis=1)
+    e_cbm = conduction.min(axis=1)
+    gaps = e_cbm - e_vbm
+    vertical = conduction - valence
+    k_direct = vertical.argmin(axis=1)
+    metal = ~gapped | (gaps <= 0)
 
-    ylist = eigenvalues - fermi
-    gaps: list[float] = []
-    std_str = ""
+    edges: list[BandEdges] = []
+    for i in range(nspin):
+        if metal[i]:
+            edges.append(BandEdges(i, int(nvalence[i]), True, 0.0))
+            continue
+        edges.append(
+            BandEdges(
+                i,
+                int(nvalence[i]),
+                False,
+                float(gaps[i]),
+                vbm=float(e_vbm[i] + fermi),
+                cbm=float(e_cbm[i] + fermi),
+                k_vbm=kpoints[valence[i] == e_vbm[i]],
+                k_cbm=kpoints[conduction[i] == e_cbm[i]],
+                direct_gap=float(vertical[i, k_direct[i]]),
+                k_direct=kpoints[k_direct[i]],
+            )
+        )
+    return edges
 
-    if stdout:
-        std_str += f"Fermi Level is [blue]{fermi:6f} (eV)[/blue]\n"
-
-    for i, spin in enumerate(ylist):
-        vbm = is_metal_or_vbm(spin) if vbms is None else vbms[i]
-        if stdout:
-            std_str += f"[yellow]{'=' * 30} {i + 1}th spin {'=' * 30} [/yellow]\n"
-        if vbm is True:
-            gaps.append(0.0)
-            if stdout:
-                std_str += "Fermi level intersects energy bands, [blue]Metal[/blue]\n"
-        else:
-            e_vbm = float(spin[:, vbm - 1].max())
-            k_vbm = get_kpoints_vbm(spin[:, vbm - 1], kpoints)
-            vbm_energy = spin[:, vbm - 1].max() + fermi
-            cbm_energy = spin[:, vbm].min() + fermi
-            e_cbm = float(spin[:, vbm].min())
-            k_cbm = get_kpoints_cbm(spin[:, vbm], kpoints)
-            gap = e_cbm - e_vbm
-            if gap <= 0:
-                gaps.append(0.0)
-                if stdout:
-                    std_str += (
-                        "Fermi level intersects energy bands, [blue]Metal[/blue]\n"
-                    )
 
-            else:
-                gaps.append(gap)
-                if stdout:
-                    std_str += f"vbm locates at{k_vbm} of [red]{vbm}th[/red] band, vbm energy is [orange1]{vbm_energy:.6f} eV[/orange1]\n"
+def print_band_edges(edges: list[BandEdges], fermi: float):
+    std_str = f"Fermi Level is [blue]{fermi:6f} (eV)[/blue]\n"
+    for edge in edges:
+        std_str += f"[yellow]{'=' * 30} {edge.spin + 1}th spin {'=' * 30} [/yellow]\n"
+        if edge.metal:
+            std_str += "Fermi level intersects energy bands, [blue]Metal[/blue]\n"
+            continue
+        std_str += f"vbm locates at{edge.k_vbm} of [red]{edge.nvalence}th[/red] band, vbm energy is [orange1]{edge.vbm:.6f} eV[/orange1]\n"
+        std_str += f"cbm locates at {edge.k_cbm} of [red]{edge.nvalence + 1}th[/red] band, cbm energy is [orange1]{edge.cbm:.6f}[/orange1] eV\n"
+        std_str += f"band gap is {edge.gap}\n"
+        if not edge.direct:
+            std_str += f"direct gap is {edge.direct_gap} at {edge.k_direct}\n"
+    rich.print(Panel(std_str))
 
-                    std_str += f"cbm locates at {k_cbm} of [red]{vbm + 1}th[/red] band, cbm energy is [orange1]{cbm_energy:.6f}[/orange1] eV\n"
-                    std_str += f"band gap is {gap}\n"
-    if stdout:
-        rich.print(Panel(std_str))
 
-    return gaps
+def get_gap(
+    eigenvalues: npt.NDArray[np.floating],
+    fermi: float,
+    kpoints: np.ndarray,
+    stdout: bool = False,
+    vbms: list[int] | None = None,
+) -> list[float]:
+    edges = band_edges(eigenvalues, fermi, kpoints, vbms)
+    if stdout:
+        print_band_edges(edges, fermi)
+    return [edge.gap for edge in edges]
 
 
 def get_valley_polarization(
@@ -88,24 +134,14 @@ def get_valley_polarization(
     point1: int = 49,
     point2: int = 149,
 ):
-    def is_metal_or_vbm(ylist: NDArray[np.float64]) -> bool | int:
-        nbands = ylist.shape[1]
-        extremum = np.array(
-            [[ylist[:, n].min(), ylist[:, n].max()] for n in range(nbands)]
-        )
-
-        if (extremum[:, 0] * extremum[:, 1]).min() > 0:
-            maxs = extremum[:, 1]
-            vbm = np.count_nonzero(abs(maxs) - maxs)
-            return int(vbm)
-        else:
-            return True
-
-    eigenvalues = eigenvalues
     ylist = eigenvalues - fermi
+    if vbms is None:
+        vbms = [
+            edge.nvalence
+            for edge in band_edges(eigenvalues, fermi, np.arange(ylist.shape[1]))
+        ]
 
-    for i, spin in enumerate(ylist):
-        vbm = is_metal_or_vbm(spin) if vbms is None else vbms[i]
+    for spin, vbm in zip(ylist, vbms):
         value1: float = spin[point1, vbm - 1]
         rich.print(f"Energy at point {point1} of band {vbm} is {value1:.6f} eV")
         value2: float = spin[point2, vbm - 1]
@@ -114,22 +150,292 @@ def get_valley_polarization(
         rich.print(f"valley polarization is {value2 - value1:.6f} eV")
 
 
+class BandWindow:
+    """Which bands lie in an energy window, for any window and spin.
+
+    A band is inside (emin, emax) if its minimum and maximum over the k-points
+    are, and partly inside if it crosses emin or emax. When the band minima
+    and maxima are both sorted, as for bands ordered by energy at every
+    k-point, ``count`` answers many windows with ``np.searchsorted``. Vasp
+    doesn't guarantee that order, other spins are compared band by band.
+    Band indexes are 0-based.
+    """
+
+    def __init__(self, eigenvalues: npt.NDArray[np.floating]):
+        # shape (nspin, nbands)
+        self.band_min = np.asarray(eigenvalues).min(axis=1)
+        self.band_max = np.asarray(eigenvalues).max(axis=1)
+        # shape (nspin,)
+        self.ordered: npt.NDArray[np.bool_] = np.logical_and(
+            (np.diff(self.band_min, axis=1) >= 0).all(axis=1),
+            (np.diff(self.band_max, axis=1) >= 0).all(axis=1),
+        )
+
+    def _masks(self, emin: npt.ArrayLike, emax: npt.ArrayLike, spin: int):
+        """Bands inside and partly inside, shape (..., nbands)."""
+        emin = np.asarray(emin)[..., None]
+        emax = np.asarray(emax)[..., None]
+        band_min, band_max = self.band_min[spin], self.band_max[spin]
+        inside = (band_min > emin) & (band_max < emax)
+        crossing = ((band_min < emin) & (band_max > emin)) | (
+            (band_min < emax) & (band_max > emax)
+        )
+        return inside, crossing & ~inside
+
+    def _bounds(self, emin: npt.ArrayLike, emax: npt.ArrayLike, spin: int):
+        band_min, band_max = self.band_min[spin], self.band_max[spin]
+        inside = (
+            np.searchsorted(band_min, emin, side="right"),
+            np.searchsorted(band_max, emax, side="left"),
+        )
+        cross_min = (
+            np.searchsorted(band_max, emin, side="right"),
+            np.searchsorted(band_min, emin, side="left"),
+        )
+        cross_max = (
+            np.searchsorted(band_max, emax, side="right"),
+            np.searchsorted(band_min, emax, side="left"),
+        )
+        return inside, cross_min, cross_max
+
+    def inside(self, emin: float, emax: float, spin: int = 0) -> list[int]:
+        """Bands fully inside (emin, emax)."""
+        inside, _ = self._masks(emin, emax, spin)
+        return np.flatnonzero(inside).tolist()
+
+    def partly(self, emin: float, emax: float, spin: int = 0) -> list[int]:
+        """Bands crossing emin or emax."""
+        _, partly = self._masks(emin, emax, spin)
+        return np.flatnonzero(partly).tolist()
+
+    def count(
+        self, emin: npt.ArrayLike, emax: npt.ArrayLike, spin: int = 0
+    ) -> tuple[npt.NDArray[np.integer], npt.NDArray[np.integer]]:
+        """Number of bands fully and partly inside each of many windows.
+
+        ``emin`` and ``emax`` are broadcast against each other, so a whole
+        sweep of windows is evaluated at once.
+        """
+        emin, emax = np.broadcast_arrays(np.asarray(emin), np.asarray(emax))
+        if not self.ordered[spin]:
+            inside_mask, partly_mask = self._masks(emin, emax, spin)
+            return inside_mask.sum(axis=-1), partly_mask.sum(axis=-1)
+
+        inside, cross_min, cross_max = self._bounds(emin, emax, spin)
+        n_inside = np.maximum(inside[1] - inside[0], 0)
+        # a band crossing both edges is only counted once
+        both = np.maximum(
+            np.minimum(cross_min[1], cross_max[1])
+            - np.maximum(cross_min[0], cross_max[0]),
+            0,
+        )
+        n_partly = (
+            np.maximum(cross_min[1] - cross_min[0], 0)
+            + np.maximum(cross_max[1] - cross_max[0], 0)
+            - both
+        )
+        return n_inside, n_partly
+
+
+class KPath:
+    """Distances along a k-path, in the 2π/Å units of the band x axis.
+
+    With ``division`` (line-mode KPOINTS) the path is made of segments of
+    ``division`` points. The step from the end of one segment to the start of
+    the next is dropped, so a jump like X|U shares one x value.
+    """
+
+    # k-points closer than this are the same point, in 2π/Å
+    tolerance = 1e-6
+
+    def __init__(
+        self,
+        kpoints: npt.NDArray[np.floating],
+        rec_cell: npt.NDArray[np.floating],
+        division: int | None = None,
+    ):
+        self.division = division
+        cartesian = np.asarray(kpoints) @ rec_cell
+        steps = np.linalg.norm(np.diff(cartesian, axis=0), axis=1) * np.pi * 2
+        if division:
+            # index of the first k-point of every segment but the first
+            starts = np.arange(division, len(cartesian), division)
+            self.jumps: npt.NDArray[np.integer] = starts[
+                steps[starts - 1] > self.tolerance
+            ]
+            steps[starts - 1] = 0.0
+        else:
+            self.jumps = np.array([], dtype=int)
+        self.xlist: npt.NDArray[np.floating] = np.concatenate(([0.0], np.cumsum(steps)))
+
+    @property
+    def boundaries(self) -> npt.NDArray[np.integer]:
+        """Index of the first and last k-point of every segment."""
+        if not self.division:
+            return np.array([], dtype=int)
+        ends = np.arange(self.division - 1, len(self.xlist), self.division)
+        return np.concatenate(([0], ends))
+
+    @property
+    def ticks(self) -> npt.NDArray[np.floating]:
+        return self.xlist[self.boundaries]
+
+
+def band_order(
+    eigenvalues: npt.NDArray[np.floating],
+    features: npt.NDArray[np.floating] | None = None,
+    division: int | None = None,
+    window: float = 0.05,
+) -> npt.NDArray[np.integer]:
+    """Follow bands through crossings along a k-path.
+
+    The slope of every band is extrapolated to the next k-point. Matching the
+    predicted energies to the new ones with the least total |ΔE| is solved
+    by sorting both, so each k step is one ``argsort``. With ``features``
+    (nspin, nkpoints, nbands, nfeatures), e.g. the projections on ions,
+    neighbouring states closer than ``window`` (eV) are swapped when that
+    increases the overlap of their features with the previous k-point.
+
+    Returns
+    -------
+    numpy.ndarray, shape (nspin, nkpoints, nbands)
+        Band indexes, ``np.take_along_axis(eigenvalues, order, axis=2)``
+        gives the connected bands.
+    """
+    nspin, nkpoints, nbands = eigenvalues.shape
+    order = np.argsort(eigenvalues, axis=2, kind="stable")
+    if features is not None:
+        norm = np.linalg.norm(features, axis=-1, keepdims=True)
+        features = features / np.where(norm > 0, norm, 1)
+    pairs = np.arange(nbands - 1)
+
+    def overlap(x: npt.NDArray[np.floating], y: npt.NDArray[np.floating]):
+        return np.einsum("ij,ij->i", x, y)
+
+    for s in range(nspin):
+        # energies sorted at every k-point
+        energies = np.take_along_axis(eigenvalues[s], order[s], axis=1)
+        previous = current = energies[0]
+        for k in range(1, nkpoints):
+            if division and k % division == 0:
+                # no slope across the boundary of two segments
+                previous = current
+            rank = np.argsort(2 * current - previous, kind="stable")
+            # band rank[j] continues into the j-th lowest state at k
+            states = np.empty(nbands, dtype=int)
+            states[rank] = np.arange(nbands)
+
+            if features is not None:
+                before = features[s, k - 1][order[s, k - 1]]
+                after = features[s, k][order[s, k]]
+                close = np.diff(energies[k]) < window
+                for parity in (0, 1):
+                    j = pairs[parity::2][close[parity::2]]
+                    a, b = rank[j], rank[j + 1]
+                    kept = overlap(before[a], after[j])
+                    kept += overlap(before[b], after[j + 1])
+                    swapped = overlap(before[a], after[j + 1])
+                    swapped += overlap(before[b], after[j])
+                    j = j[swapped > kept]
+                    a, b = rank[j], rank[j + 1]
+                    states[a], states[b] = j + 1, j
+                    rank[j], rank[j + 1] = b, a
+
+            order[s, k] = order[s, k][states]
+            previous, current = current, energies[k][states]
+    return order
+
+
 orbitals_str_all = (
     "s py pz px dxy dyz dz2 dxz dx2-y2 fy3x2 fxyz fyz2 fz3 fxz2 fzx2 fx3".split()
 )
 
 
+@dataclass
+class DosMoments:
+    """Spectral moments of DOS curves, energies relative to the Fermi level (eV).
+
+    Every field has the shape of the leading axes of the DOS, e.g. one value
+    per selection. ``states`` is the integral over the window and ``filling``
+    the fraction of it below the Fermi level.
+    """
+
+    states: npt.NDArray[np.floating]
+    center: npt.NDArray[np.floating]
+    width: npt.NDArray[np.floating]
+    skewness: npt.NDArray[np.floating]
+    kurtosis: npt.NDArray[np.floating]
+    filling: npt.NDArray[np.floating]
+
+
+def dos_moments(
+    energies: npt.NDArray[np.floating],
+    dos: npt.NDArray[np.floating],
+    fermi: float = 0.0,
+    erange: tuple[float, float] | None = None,
+) -> DosMoments:
+    """Center, width, skewness, kurtosis and filling of many DOS at once.
+
+    Parameters
+    ----------
+    energies
+        shape (nedos,)
+    dos
+        shape (..., nedos), e.g. one projected DOS per selection.
+    erange
+        Window relative to the Fermi level, all energies by default.
+    """
+    energies = np.asarray(energies, dtype=float) - fermi
+    weight = np.gradient(energies)
+    if erange is not None:
+        weight = weight * ((energies >= erange[0]) & (energies <= erange[1]))
+    # states of every grid point, shape (..., nedos)
+    w = np.asarray(dos) * weight
+    states = w.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        center = (w @ energies) / states
+        d = energies - center[..., None]
+        variance = (w * d**2).sum(axis=-1) / states
+        skewness = (w * d**3).sum(axis=-1) / states / variance**1.5
+        kurtosis = (w * d**4).sum(axis=-1) / states / variance**2
+        filling = (w @ (energies <= 0).astype(float)) / states
+    return DosMoments(states, center, np.sqrt(variance), skewness, kurtosis, filling)
+
+
 class ParsePro:
+    """Parse a selection like ``"Mo:d;S:p"`` of atoms and orbitals.
+
+    ``result`` lists the (atom, orbital) pairs and ``mask`` marks them in an
+    (ionnum, orbital_num) array for ``VaspData.project``. Parsed selections
+    are kept per structure, so the same string is only parsed once.
+    """
+
+    # (symbols, orbital_num, selection) -> (result, result_str, mask)
+    _compiled: dict[
+        tuple[tuple[str, ...], int, str],
+        tuple[list[tuple[int, int]], str, npt.NDArray[np.bool_]],
+    ] = {}
+
     def __init__(
         self,
         data: VaspData,
         atom_orbital_str: str,
         color: str,
         index: int,
+        quiet: bool = False,
     ):
         self.__data: VaspData = data
         self.__orbital_str_all = orbitals_str_all[0 : self.__data.orbital_num]
-        self.result, self.result_str = self.handle(atom_orbital_str)
+        key = (tuple(data.symbols), data.orbital_num, atom_orbital_str)
+        if key not in self._compiled:
+            result, result_str = self.handle(atom_orbital_str)
+            mask = np.zeros((len(data.symbols), data.orbital_num), dtype=bool)
+            if result:
+                mask[tuple(np.transpose(result))] = True
+            self._compiled[key] = (result, result_str, mask)
+        self.result, self.result_str, self.mask = self._compiled[key]
+        if quiet:
+            return
         test = Panel(
             self.result_str,
             title=f"projected atoms and orbitals of your choice for index {index}",
@@ -205,3 +511,55 @@ class ParsePro:
                     )
                     sys.exit()
                 return (orbitals_list, orbital_str)
+
+
+def selection_moments(
+    data: VaspData,
+    selections: list[str],
+    per_atom: bool = False,
+    erange: tuple[float, float] | None = None,
+    spin: int | None = None,
+) -> tuple[list[str], DosMoments]:
+    """DOS moments of ``ParsePro`` selections such as ``"Pt:d"``.
+
+    All selections are projected from ``dospar`` in one pass. With
+    ``per_atom`` every atom of a selection gets its own entry, labelled
+    ``"Pt:d@Pt3"``. Spins are summed unless ``spin`` is given, noncollinear
+    runs use the total and have no ``spin`` to choose.
+
+    Returns
+    -------
+    list[str]
+        Label of every entry.
+    DosMoments
+        Fields of shape (len(labels),).
+    """
+    labels: list[str] = []
+    masks: list[npt.NDArray[np.bool_]] = []
+    for i, selection in enumerate(selections):
+        mask = ParsePro(data, selection, "default", i, quiet=True).mask
+        if not per_atom:
+            labels.append(selection)
+            masks.append(mask)
+            continue
+        for atom in np.flatnonzero(mask.any(axis=1)):
+            single = np.zeros_like(mask)
+            single[atom] = mask[atom]
+            labels.append(f"{selection}@{data.symbols[atom]}{atom}")
+            masks.append(single)
+
+    # shape (nselection, nspin, nedos)
+    dos = data.project_dos(np.stack(masks))
+    if spin is not None and dos.shape[1] == 4:
+        # the channels are total, mx, my and mz instead of spins
+        raise ValueError("spin can't be selected for noncollinear runs")
+    if spin is not None and not 0 <= spin < dos.shape[1]:
+        raise ValueError(f"spin {spin} out of range for {dos.shape[1]} spins")
+    if spin is not None:
+        dos = dos[:, spin]
+    elif dos.shape[1] == 4:
+        dos = dos[:, 0]
+    else:
+        dos = dos.sum(axis=1)
+    energies = np.reshape(data.dose, (-1, np.shape(data.dose)[-1]))[0]
+    return labels, dos_moments(energies, dos, data.fermi, erange)
@@ -0,0 +1,210 @@
+"""Small synthetic vasprun.xml and vaspout.h5 files for the tests."""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+ORBITALS = ["s", "py", "pz", "px", "dxy", "dyz", "dz2", "dxz", "x2-y2"]
+
+
+def write_vasprun(
+    path: Path,
+    ispin: int = 1,
+    noncollinear: bool = False,
+    nkpoints: int = 6,
+    nbands: int = 6,
+    symbols: tuple[str, ...] = ("Mo", "S", "S"),
+    nedos: int = 51,
+    seed: int = 0,
+    kpoints_opt: int = 0,
+) -> Path:
+    """With ``kpoints_opt`` k-points, the blocks of a KPOINTS_OPT band path
+    follow the main ones, as VASP >= 6.3 writes them."""
+    rng = np.random.default_rng(seed)
+    nion = len(symbols)
+    nspin_pro = 4 if noncollinear else ispin
+    fields = "".join(f"<field>{i}</field>" for i in ORBITALS)
+    lines = ['<?xml version="1.0" encoding="ISO-8859-1"?>', "<modeling>"]
+
+    def kpoints_block(nk: int):
+        lines.append(
+            '<kpoints><generation param="listgenerated">'
+            f'<v type="int" name="divisions">{nk} </v></generation>'
+            '<varray name="kpointlist">'
+        )
+        lines.extend(f"<v> {x:f} 0 0 </v>" for x in np.linspace(0, 0.5, nk))
+        lines.append('</varray><varray name="weights">')
+        lines.extend([f"<v> {1 / nk:f} </v>"] * nk)
+        lines.append("</varray></kpoints>")
+
+    kpoints_block(nkpoints)
+    lines.append(
+        '<parameters><separator name="electronic">'
+        f'<i type="int" name="NBANDS"> {nbands}</i>'
+        '<separator name="electronic spin">'
+        f'<i type="int" name="ISPIN"> {ispin}</i>'
+        '<i type="logical" name="LNONCOLLINEAR"> '
+        f'{"T" if noncollinear else "F"} </i></separator></separator>'
+        f'<separator name="dos"><i type="int" name="NEDOS"> {nedos}</i>'
+        "</separator></parameters>"
+    )
+    lines.append(
+        f"<atominfo><atoms> {nion} </atoms><types> 2 </types>"
+        '<array name="atoms"><dimension dim="1">ion</dimension>'
+        '<field type="string">element</field><field type="int">atomtype</field>'
+        "<set>"
+    )
+    lines += [f"<rc><c>{i:2}</c><c> 1</c></rc>" for i in symbols]
+    lines.append("</set></array></atominfo>")
+
+    def structure(name: str):
+        lines.append(
+            f'<structure name="{name}"><crystal><varray name="basis">'
+            "<v> 3.0 0 0 </v><v> 0 3.0 0 </v><v> 0 0 3.0 </v></varray>"
+            '<varray name="rec_basis"><v> 0.3333 0 0 </v><v> 0 .3333 0 </v>'
+            '<v> 0 0 .3333 </v></varray></crystal><varray name="positions">'
+        )
+        lines.extend(f"<v> {i / nion:f} 0 0 </v>" for i in range(nion))
+        lines.append("</varray></structure>")
+
+    def eigenvalue_block(nk: int):
+        eigenvalues = np.sort(rng.normal(size=(ispin, nk, nbands)) * 3, axis=2)
+        lines.append(
+            '<eigenvalues><array><dimension dim="1">band</dimension>'
+            "<field>eigene</field><field>occ</field><set>"
+        )
+        for s in range(ispin):
+            lines.append(f'<set comment="spin {s + 1}">')
+            for k in range(nk):
+                lines.append(f'<set comment="kpoint {k + 1}">')
+                lines.extend(f"<r> {e:f} 1.0 </r>" for e in eigenvalues[s, k])
+                lines.append("</set>")
+            lines.append("</set>")
+        lines.append("</set></array></eigenvalues>")
+
+    def dos_block(comment: str, efermi: float):
+        dose = np.linspace(-10, 10, nedos)
+        tdos = rng.random((ispin, nedos))
+        pdos = rng.random((nion, nspin_pro, nedos, len(ORBITALS)))
+        lines.append(
+            f'<dos{comment}><i name="efermi"> {efermi} </i><total><array>'
+            '<dimension dim="1">gridpoints</dimension><field>energy</field>'
+            "<field>total</field><field>integrated</field><set>"
+        )
+        for s in range(ispin):
+            lines.append(f'<set comment="spin {s + 1}">')
+            lines.extend(f"<r> {e:f} {d:f} 0 </r>" for e, d in zip(dose, tdos[s]))
+            lines.append("</set>")
+        lines.append(
+            '</set></array></total><partial><array><dimension dim="1">gridpoints'
+            f"</dimension><field>energy</field>{fields}<set>"
+        )
+        for i in range(nion):
+            lines.append(f'<set comment="ion {i + 1}">')
+            for s in range(nspin_pro):
+                lines.append(f'<set comment="spin {s + 1}">')
+                for e, row in zip(dose, pdos[i, s]):
+                    values = " ".join(f"{x:f}" for x in row)
+                    lines.append(f"<r> {e:f} {values} </r>")
+                lines.append("</set>")
+            lines.append("</set>")
+        lines.append("</set></array></partial></dos>")
+
+    def projected_array(nk: int):
+        projected = rng.random((nspin_pro, nk, nbands, nion, len(ORBITALS)))
+        lines.append(
+            '<array><dimension dim="1">orbital</dimension>'
+            '<dimension dim="2">ion</dimension><dimension dim="3">band</dimension>'
+            '<dimension dim="4">kpoint</dimension><dimension dim="5">spin</dimension>'
+            f"{fields}<set>"
+        )
+        for s in range(nspin_pro):
+            lines.append(f'<set comment="spin{s + 1}">')
+            for k in range(nk):
+                lines.append(f'<set comment="kpoint {k + 1}">')
+                for b in range(nbands):
+                    lines.append(f'<set comment="band {b + 1}">')
+                    for row in projected[s, k, b]:
+                        values = " ".join(f"{x:.4f}" for x in row)
+                        lines.append(f"<r> {values} </r>")
+                    lines.append("</set>")
+                lines.append("</set>")
+            lines.append("</set>")
+        lines.append("</set></array>")
+
+    structure("initialpos")
+    lines.append(
+        '<calculation><scstep><energy><i name="e_fr_energy"> 1.0 </i>'
+        "</energy></scstep>"
+    )
+    structure("")
+    eigenvalue_block(nkpoints)
+    dos_block("", 0.5)
+    lines.append("<projected>")
+    eigenvalue_block(nkpoints)
+    projected_array(nkpoints)
+    lines.append("</projected>")
+    if kpoints_opt:
+        lines.append('<eigenvalues_kpoints_opt comment="kpoints_opt">')
+        kpoints_block(kpoints_opt)
+        eigenvalue_block(kpoints_opt)
+        lines.append("</eigenvalues_kpoints_opt>")
+        dos_block(' comment="kpoints_opt"', 1.5)
+        lines.append('<projected_kpoints_opt comment="kpoints_opt">')
+        eigenvalue_block(kpoints_opt)
+        projected_array(kpoints_opt)
+        lines.append("</projected_kpoints_opt>")
+    lines.append("</calculation>")
+    structure("finalpos")
+    lines.append("</modeling>")
+    path.write_text("\n".join(lines))
+    return path
+
+
+def write_vaspout(
+    path: Path,
+    ispin: int = 2,
+    nkpoints: int = 8,
+    nbands: int = 6,
+    nion: int = 3,
+    nedos: int = 60,
+    seed: int = 5,
+) -> Path:
+    import h5py
+
+    rng = np.random.default_rng(seed)
+    norb = len(ORBITALS)
+    with h5py.File(path, "w") as f:
+        f["results/positions/ion_types"] = np.array([b"Pt", b"O"])
+        f["results/positions/number_ion_types"] = np.array([2, nion - 2])
+        f["results/positions/position_ions"] = rng.random((nion, 3))
+        f["results/positions/lattice_vectors"] = np.eye(3) * 3
+        kpoints = np.zeros((nkpoints, 3))
+        kpoints[:, 0] = np.linspace(0, 0.5, nkpoints)
+        f["results/electron_eigenvalues/kpoint_coords"] = kpoints
+        f["results/electron_eigenvalues/kpoints_symmetry_weight"] = np.ones(nkpoints)
+        f["results/electron_eigenvalues/eigenvalues"] = np.sort(
+            rng.normal(size=(ispin, nkpoints, nbands)) * 3, axis=2
+        )
+        f["results/projectors/par"] = rng.random((ispin, nion, norb, nkpoints, nbands))
+        f["results/electron_dos/efermi"] = 0.3
+        f["results/electron_dos/dos"] = rng.random((ispin, nedos))
+        f["results/electron_dos/energies"] = np.linspace(-8, 8, nedos)
+        f["results/electron_dos/dosi"] = rng.random((ispin, nedos))
+        f["results/electron_dos/dospar"] = rng.random((ispin, nion, norb, nedos))
+        f["results/electron_dos/nedos"] = nedos
+        f["input/kpoints/mode"] = b"l"
+        f["input/kpoints/number_kpoints"] = nkpoints // 2
+        f["input/kpoints/labels_kpoints"] = np.array([b"G", b"X", b"X", b"M"])
+    return path
+
+
+@pytest.fixture
+def vasprun(tmp_path: Path) -> Path:
+    return write_vasprun(tmp_path / "vasprun.xml")
+
+
+@pytest.fixture
+def vaspout(tmp_path: Path) -> Path:
+    return write_vaspout(tmp_path / "vaspout.h5")
@@ -0,0 +1,140 @@
+from pathlib import Path
+
+import h5py
+import matplotlib
+
+matplotlib.use("agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from hbtools.vasp.band.bandplot import BandData, BandPlot, write_band_text
+from hbtools.vasp.band.params import BandParams
+
+from hbtools.vasp import vasp_utils
+
+from conftest import write_vaspout, write_vasprun
+
+
+@pytest.fixture
+def plot_band(tmp_path: Path):
+    rc = tmp_path / "matplotlibrc"
+    rc.touch()
+
+    def plot(file: Path, **kwargs) -> BandPlot:
+        params = BandParams(
+            file=str(file),
+            vaspfileformat="xml" if file.suffix == ".xml" else "h5",
+            matplotlibrc=rc,
+            show=False,
+            export=False,
+            **kwargs,
+        )
+        fig, ax = plt.subplots()
+        try:
+            return BandPlot(params, fig, ax)
+        finally:
+            plt.close(fig)
+
+    return plot
+
+
+@pytest.mark.parametrize("ispin", [1, 2])
+def test_fat_band_from_vasprun(tmp_path, plot_band, ispin):
+    file = write_vasprun(tmp_path / "vasprun.xml", ispin=ispin)
+    plot = plot_band(file, pro_atoms_orbitals=["Mo:d"])
+    assert len(plot.ax.collections) == 1
+
+    data = BandData(plot.params)
+    (proarray,) = data.proarray_list
+    assert proarray.shape == data.eigenvalues.shape
+    np.testing.assert_allclose(proarray, data.reader.projected[:, 0, 4:9].sum(axis=1))
+
+
+@pytest.mark.parametrize("spin", [None, 0, 1])
+@pytest.mark.parametrize("clip", [False, True])
+def test_projected_segments_spin(tmp_path, plot_band, spin, clip):
+    file = write_vasprun(tmp_path / "vasprun.xml", ispin=2)
+    yrange = (-1.0, 1.0)
+    plot = plot_band(
+        file, pro_atoms_orbitals=["Mo:d"], spin=spin, clip_yrange=clip, yrange=yrange
+    )
+
+    assert list(plot.ax.collections) == [plot.lc]
+    segments = np.asarray(plot.lc.get_segments())
+    assert len(segments) == len(plot.lc.get_array())
+    nspin, nkpoints, nbands = plot.data.ylist.shape
+    per_spin = nbands * (2 * nkpoints - 2)
+    y = segments[:, :, 1]
+    if not clip:
+        assert len(segments) == per_spin * (nspin if spin is None else 1)
+        if spin is not None:
+            expected = plot.segments.reshape(nspin, per_spin, 2, 2)[spin]
+            np.testing.assert_allclose(segments, expected)
+    else:
+        assert ((y.max(axis=1) >= yrange[0]) & (y.min(axis=1) <= yrange[1])).all()
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 7, 1 << 16])
+@pytest.mark.parametrize("weighted", [False, True])
+def test_write_band_text_chunks(tmp_path, chunk_rows, weighted):
+    rng = np.random.default_rng(0)
+    xlist = np.linspace(0, 1, 5)
+    eigen = rng.normal(size=(5, 9))
+    weight = rng.random((5, 9)) if weighted else None
+    file = tmp_path / "band.txt"
+    write_band_text(str(file), xlist, eigen, weight, chunk_rows=chunk_rows)
+
+    expected = tmp_path / "expected.txt"
+    with open(expected, "w") as f:
+        for i in range(eigen.shape[1]):
+            columns = [xlist, eigen[:, i]]
+            if weight is not None:
+                columns.append(weight[:, i])
+            np.savetxt(f, np.column_stack(columns), fmt="%.10f")
+            f.write("\n")
+    assert file.read_text() == expected.read_text()
+
+
+def test_band_edges_with_fix_order(tmp_path, plot_band):
+    file = write_vaspout(tmp_path / "vaspout.h5", ispin=1, nbands=4)
+    # two valence bands crossing in the first segment of the path
+    k = np.linspace(0, 1, 8)
+    rising = -3.0 + 5 * np.minimum(k, 3 / 7)
+    falling = -1.0 - 1.5 * k
+    bands = [np.minimum(rising, falling), np.maximum(rising, falling)]
+    eigenvalues = np.stack([*bands, 1.3 + 0 * k, 2.3 + k], axis=-1)[None]
+    with h5py.File(file, "r+") as f:
+        f["results/electron_eigenvalues/eigenvalues"][...] = eigenvalues
+
+    plot = plot_band(file, fix_order=True)
+    assert not np.array_equal(plot.data.eigenvalues, eigenvalues)
+    (edges,) = plot.edges
+    (expected,) = vasp_utils.band_edges(eigenvalues, 0.3, plot.data.kpoints)
+    assert edges.vbm == pytest.approx(np.max(bands[1]))
+    assert edges.gap == pytest.approx(expected.gap)
+    assert edges.gap == pytest.approx(1.3 - np.max(bands[1]))
+
+
+def test_fat_band_without_dospar(tmp_path, plot_band):
+    file = write_vaspout(tmp_path / "vaspout.h5")
+    with h5py.File(file, "r+") as f:
+        del f["results/electron_dos/dospar"]
+    plot = plot_band(file, pro_atoms_orbitals=["Pt:d"])
+    assert len(plot.ax.collections) == 1
+    assert "dospar" not in plot.data.reader.__dict__
+
+
+def test_decimate_columns_follow_save_dpi_and_xlim(tmp_path, plot_band):
+    file = write_vaspout(tmp_path / "vaspout.h5", nkpoints=40)
+    plot = plot_band(file, decimate=True)
+    x = np.asarray(plot.data.xlist)
+    width = plot.ax.get_window_extent().width
+    with matplotlib.rc_context({"savefig.dpi": "figure"}):
+        assert plot.pixel_columns(x) == np.ceil(width)
+    with matplotlib.rc_context({"savefig.dpi": 300}):
+        assert plot.pixel_columns(x) == np.ceil(width * 300 / plot.fig.dpi)
+        # zoomed in to the first half, the whole path needs twice the columns
+        plot.ax.set_xlim(x[0], (x[0] + x[-1]) / 2)
+        assert plot.pixel_columns(x) == np.ceil(2 * width * 300 / plot.fig.dpi)
@@ -0,0 +1,157 @@
+import os
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from conftest import write_vaspout
+
+COMMANDS = ["vasp", "input", "calc", "subfig", "serve"]
+# cumulative import time of hbtools for ``hb --help``, in microseconds
+HELP_IMPORT_BUDGET = 150_000
+# wall time of hb vasp band --save on a small file without a display, seconds
+BAND_SAVE_BUDGET = 3.0
+_MAIN = "import sys, hbtools; sys.argv[0] = 'hb'; hbtools.main()"
+
+
+def hb(*args: str, cwd=None, env=None) -> subprocess.CompletedProcess[str]:
+    """Run the hb entry point in a fresh interpreter, without a daemon."""
+    env = {**os.environ, "HB_NO_DAEMON": "1", **(env or {})}
+    return subprocess.run(
+        [sys.executable, "-c", _MAIN, *args],
+        capture_output=True,
+        text=True,
+        cwd=cwd,
+        env=env,
+    )
+
+
+def test_help_lists_every_command():
+    result = hb("--help")
+    assert result.returncode == 0, result.stderr
+    for command in COMMANDS:
+        assert command in result.stdout
+    # no internal notes in the description of hb
+    assert "Keeps hb" not in result.stdout
+
+
+@pytest.mark.parametrize("command", COMMANDS)
+def test_command_help(command: str):
+    result = hb(command, "--help")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert f"hb {command}" in result.stdout
+
+
+def test_subfig_arguments(tmp_path):
+    result = hb("subfig", "2", "3", cwd=tmp_path)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "nrows=2, ncols=3" in (tmp_path / "subfig.py").read_text()
+
+
+def test_plot_alias():
+    import hbtools.plot.band.params as old
+    import hbtools.vasp.band.params as new
+
+    assert old is new
+    assert new.__spec__ is not None and new.__spec__.name == new.__name__
+
+
+def test_help_import_time():
+    code = "import sys; sys.argv = ['hb', '--help']; import hbtools; print(sorted(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "HB_NO_DAEMON": "1"},
+    )
+    assert result.returncode == 0, result.stderr
+    # no subcommand is imported to list them
+    for module in ("hbtools.vasp.cli", "hbtools.input.cli", "hbtools.calc.cli"):
+        assert f"'{module}'" not in result.stdout
+    times = re.findall(
+        r"import time:\s+\d+ \|\s+(\d+) \| hbtools$", result.stderr, re.M
+    )
+    assert times and int(times[0]) < HELP_IMPORT_BUDGET
+
+
+def test_band_save_headless(vaspout, tmp_path):
+    rc = tmp_path / "matplotlibrc"
+    rc.touch()
+    # hb exits through SystemExit, list the modules on the way out
+    code = "import atexit, sys; atexit.register(lambda: print(sorted(sys.modules))); "
+    code += _MAIN
+    env = {**os.environ, "HB_NO_DAEMON": "1"}
+    env.pop("DISPLAY", None)
+    env.pop("MPLBACKEND", None)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code, "vasp", "band", vaspout.name]
+        + ["--save", "band.png", "--dontshow", "--matplotlibrc", str(rc)],
+        capture_output=True,
+        text=True,
+        cwd=tmp_path,
+        env=env,
+    )
+    elapsed = time.perf_counter() - start
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert (tmp_path / "band.png").exists()
+    # saving never loads an interactive backend
+    assert "qt" not in result.stdout.lower()
+    assert "'matplotlib.backends.backend_agg'" in result.stdout
+    assert elapsed < BAND_SAVE_BUDGET
+
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_band_series_export(tmp_path, workers):
+    rc = tmp_path / "matplotlibrc"
+    rc.touch()
+    for i, name in enumerate(["a", "b"]):
+        (tmp_path / name).mkdir()
+        write_vaspout(tmp_path / name / "vaspout.h5", ispin=2, seed=i)
+    result = hb(
+        *["vasp", "band", "*/vaspout.h5", "--save", "out", "-j", workers],
+        *["--dontshow", "--matplotlibrc", str(rc)],
+        cwd=tmp_path,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert not (tmp_path / "band_up.txt").exists()
+    # every file keeps its own data next to its figure
+    bands = []
+    for name in ["a", "b"]:
+        assert (tmp_path / "out" / name / "vaspout.h5.png").exists()
+        data = tmp_path / "out" / name / "vaspout.h5_data"
+        bands.append(np.loadtxt(data / "band_up.txt"))
+        assert (data / "band_down.txt").exists()
+    assert not np.array_equal(*bands)
+
+
+@pytest.mark.parametrize("command", ["gap", "dband"])
+def test_batch_workers_per_cpu(tmp_path, command):
+    for i, name in enumerate(["a", "b"]):
+        (tmp_path / name).mkdir()
+        write_vaspout(tmp_path / name / "vaspout.h5", seed=i)
+    result = hb("vasp", command, "a", "b", "-j", "0", cwd=tmp_path)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "a/vaspout.h5" in result.stdout and "b/vaspout.h5" in result.stdout
+
+
+def test_band_series_failure_exit_code(tmp_path):
+    rc = tmp_path / "matplotlibrc"
+    rc.touch()
+    for name in ["a", "b"]:
+        (tmp_path / name).mkdir()
+    write_vaspout(tmp_path / "a" / "vaspout.h5")
+    (tmp_path / "b" / "vaspout.h5").write_text("not hdf5")
+    result = hb(
+        *["vasp", "band", "*/vaspout.h5", "--save", "out", "-j", "2"],
+        *["--dontshow", "--matplotlibrc", str(rc)],
+        cwd=tmp_path,
+    )
+    assert result.returncode == 1, result.stdout + result.stderr
+    assert (tmp_path / "out" / "a" / "vaspout.h5.png").exists()
+    # a line with the time of every file
+    assert re.search(r"saved +[\d.]+ s +a/vaspout.h5", result.stdout)
+    assert re.search(r"failed +[\d.]+ s +b/vaspout.h5", result.stdout)
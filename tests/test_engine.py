@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from hbtools.vasp.dos import engine
+
+
+def full_grid(n: int) -> np.ndarray:
+    axes = [np.arange(n) / n] * 3
+    return np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+
+
+def dense_tetrahedron_dos(eigenvalues, kpoints, energies):
+    """Every tetrahedron evaluated on every energy point."""
+    corners = engine.tetrahedra(kpoints)
+    e = np.sort(eigenvalues[0][corners].transpose(0, 2, 1), axis=-1).reshape(-1, 4)
+    x = np.broadcast_to(energies, (len(e), len(energies)))
+    e4 = np.repeat(e[:, None, :], len(energies), axis=1).reshape(-1, 4)
+    g = engine._tetrahedron_weights(e4, x.reshape(-1)).reshape(x.shape)
+    g[(x < e[:, :1]) | (x >= e[:, 3:])] = 0
+    return g.sum(axis=0) / len(corners)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_tetrahedron_dos_matches_dense(monkeypatch, workers):
+    kpoints = full_grid(4)
+    rng = np.random.default_rng(1)
+    bands = np.cos(2 * np.pi * kpoints).sum(axis=1)[:, None] * [0.5, 1.0, 2.0]
+    eigenvalues = np.sort(bands + rng.normal(size=3), axis=1)[None]
+    energies = engine.dos_grid(eigenvalues, 301)
+    # groups of a few points, so the splitting is exercised
+    monkeypatch.setattr(engine, "CHUNK_SIZE", 16 * 64 * workers)
+    dos = engine.tetrahedron_dos(eigenvalues, kpoints, energies, workers=workers)
+    np.testing.assert_allclose(
+        dos[0], dense_tetrahedron_dos(eigenvalues, kpoints, energies)
+    )
+    de = energies[1] - energies[0]
+    assert dos.sum() * de == pytest.approx(3, rel=1e-2)
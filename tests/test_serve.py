@@ -0,0 +1,81 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from hbtools import serve
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="the daemon needs Unix sockets"
+)
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    path = tmp_path / "hb.sock"
+    monkeypatch.setenv("HB_SOCKET", str(path))
+    monkeypatch.delenv("HB_NO_DAEMON", raising=False)
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "import sys, hbtools; sys.argv[0] = 'hb'; hbtools.main()",
+            "serve",
+            "--cache-size",
+            "2",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    deadline = time.monotonic() + 30
+    while not path.exists():
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            pytest.fail(f"hb serve did not start: {process.communicate()[0]}")
+        time.sleep(0.05)
+    yield path
+    process.terminate()
+    process.wait(10)
+
+
+def test_forward(daemon, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert serve.forward(["subfig", "3", "2"]) == 0
+    assert "nrows=3, ncols=2" in (tmp_path / "subfig.py").read_text()
+
+
+def test_forward_error_code(daemon, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert serve.forward(["subfig", "rows"]) == 2
+
+
+def test_no_daemon(tmp_path, monkeypatch):
+    monkeypatch.setenv("HB_SOCKET", str(tmp_path / "missing.sock"))
+    assert serve.forward(["subfig"]) is None
+    monkeypatch.setenv("HB_NO_DAEMON", "1")
+    assert serve.forward(["subfig"]) is None
+
+
+def test_forward_refuses_open_socket(daemon, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    daemon.chmod(0o666)
+    assert serve.forward(["subfig", "3", "2"]) is None
+    assert not (tmp_path / "subfig.py").exists()
+    assert "not a private socket" in capsys.readouterr().err
+
+
+def test_default_socket_in_private_dir(tmp_path, monkeypatch):
+    monkeypatch.delenv("HB_SOCKET", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    monkeypatch.setenv("TMPDIR", str(tmp_path))
+    monkeypatch.setattr(serve.tempfile, "tempdir", None)
+    path = serve.socket_path()
+    assert path.parent == tmp_path / f"hbtools-{os.getuid()}"
+    # a directory made by someone else, or open to others, is never used
+    path.parent.mkdir(mode=0o755)
+    path.parent.chmod(0o755)
+    assert not serve._private(path.parent)
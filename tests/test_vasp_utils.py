@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from hbtools.vasp.dataread import ReadVasprun
+from hbtools.vasp.dataread.batch import read_dband
+from hbtools.vasp.vasp_utils import BandWindow, selection_moments
+
+from conftest import write_vasprun
+
+
+def count_loop(eigenvalues, emin, emax):
+    """The per-band loop nbands_ewin used before BandWindow."""
+    band_in = band_out = 0
+    for b_min, b_max in zip(eigenvalues.min(axis=0), eigenvalues.max(axis=0)):
+        if b_min > emin and b_max < emax:
+            band_in += 1
+        elif (b_min < emin and b_max > emin) or (b_min < emax and b_max > emax):
+            band_out += 1
+    return band_in, band_out
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_band_window_matches_loop(ordered):
+    rng = np.random.default_rng(1)
+    eigenvalues = np.sort(rng.normal(size=(2, 40, 30)) * 4, axis=2)
+    if not ordered:
+        # one k-point with its bands out of energy order
+        eigenvalues[0, 7] = rng.permutation(eigenvalues[0, 7])
+    window = BandWindow(eigenvalues)
+    assert bool(window.ordered[0]) is ordered
+
+    emin = rng.uniform(-10, 5, 2000)
+    emax = emin + rng.uniform(0, 10, 2000)
+    for spin in range(2):
+        n_in, n_out = window.count(emin, emax, spin)
+        expected = [count_loop(eigenvalues[spin], *w) for w in zip(emin, emax)]
+        np.testing.assert_array_equal(np.stack([n_in, n_out], axis=1), expected)
+        for i in range(0, 2000, 100):
+            assert len(window.inside(emin[i], emax[i], spin)) == n_in[i]
+            assert len(window.partly(emin[i], emax[i], spin)) == n_out[i]
+
+
+@pytest.mark.parametrize("spin", [0, 1])
+def test_selection_moments_spin(tmp_path, spin):
+    data = ReadVasprun(write_vasprun(tmp_path / "vasprun.xml", ispin=2))
+    _, total = selection_moments(data, ["Mo:d"])
+    _, single = selection_moments(data, ["Mo:d"], spin=spin)
+    assert 0 < single.states[0] < total.states[0]
+
+
+@pytest.mark.parametrize("spin", [0, 1, 3])
+def test_selection_moments_noncollinear_spin(tmp_path, spin):
+    file = write_vasprun(tmp_path / "vasprun.xml", noncollinear=True)
+    with pytest.raises(ValueError, match="noncollinear"):
+        selection_moments(ReadVasprun(file), ["Mo:d"], spin=spin)
+    (row,) = read_dband(file, ["Mo:d"], spin=spin)
+    assert row["center"] is None
+    assert "noncollinear" in row["error"]
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from hbtools.vasp.dataread import ReadVasprun
+from hbtools.vasp.dataread import cache as vasp_cache
+
+from conftest import write_vasprun
+
+
+def test_cache_off_by_default(vasprun, monkeypatch):
+    monkeypatch.delenv("HB_CACHE", raising=False)
+    ReadVasprun(vasprun).eigenvalues
+    assert not (vasprun.parent / vasp_cache.CACHE_DIR).exists()
+
+
+@pytest.mark.parametrize("env", [False, True])
+def test_cache_round_trip(vasprun, monkeypatch, env):
+    if env:
+        monkeypatch.setenv("HB_CACHE", "1")
+    cache = None if env else True
+    parsed = ReadVasprun(vasprun, cache=cache)
+    assert vasp_cache.load(vasprun) is not None
+    cached = ReadVasprun(vasprun, cache=cache)
+    assert isinstance(cached._blocks, vasp_cache.LazyNpz)
+    np.testing.assert_array_equal(cached.eigenvalues, parsed.eigenvalues)
+    np.testing.assert_array_equal(cached.projected, parsed.projected)
+
+
+@pytest.mark.parametrize("ispin", [1, 2])
+def test_kpoints_opt_blocks_skipped(tmp_path, ispin):
+    # the main blocks are drawn first, so both files share them
+    plain = ReadVasprun(write_vasprun(tmp_path / "plain.xml", ispin=ispin))
+    opt = ReadVasprun(
+        write_vasprun(tmp_path / "opt.xml", ispin=ispin, kpoints_opt=10), cache=False
+    )
+    assert opt.fermi == plain.fermi == 0.5
+    for name in ["kpoints", "weights", "eigenvalues", "projected", "dos", "dospar"]:
+        np.testing.assert_array_equal(getattr(opt, name), getattr(plain, name))
+
+
+def test_orbital_num_from_cache_header(vasprun):
+    data = ReadVasprun(vasprun, cache=True)
+    cached = ReadVasprun(vasprun, cache=True)
+    assert isinstance(cached._blocks, vasp_cache.LazyNpz)
+    assert cached.orbital_num == data.orbital_num == 9
+    assert "projected" not in cached._blocks._loaded